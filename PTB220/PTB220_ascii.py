@@ -4,6 +4,9 @@ import re
 import os
 import serial
 import value_checks
+from mqtt_publisher import MQTTpublisher
+from pressure_tendency import PressureTendency
+from rolling_stats import RollingStats
 from datetime import datetime
 from threading import Timer
 
@@ -22,6 +25,8 @@ class PTB220_ascii:
         self.pressure_change = None
         self.pressure_trend = None
         self.timestamp = None
+        self.tendency = PressureTendency('PTB220')
+        self.stats = RollingStats(['pressure'])
 
         self.serial_port_name = os.getenv('PTB220_PORT', '/dev/ttyUSB0')
         self.serial_baud = os.getenv('PTB220_BAUD', 9600)
@@ -29,6 +34,8 @@ class PTB220_ascii:
         logging.info('Serial port: ' + str(self.serial_port))
         logging.info('Sensor mode: ascii')
 
+        self.mqtt_publisher = MQTTpublisher('PTB220')
+
         self.serial_port_reader()
 
     def serial_port_reader(self):
@@ -42,6 +49,7 @@ class PTB220_ascii:
                 logging.info('RAW data: ' + data_line)
                 self.data_decoder(data_line)
                 logging.info(self.get_readings())
+                self.mqtt_publisher.publish(self.get_readings())
         except serial.SerialException as error:
             warnings.warn("Serial port error: " + str(error), Warning)
         # Asynchronously schedule this function to be run every 1 seconds
@@ -67,6 +75,8 @@ class PTB220_ascii:
                     self.pressure = float(data[2]) + pressure_correction
                     self.pressure_change = None
                     self.pressure_trend = None
+                    self.tendency.update(self.pressure)
+                    self.stats.update({'pressure': self.pressure})
                 # Pressure change and trend only available after instrument
                 # has been running for 3hrs
                 if len(data) > 9:
@@ -74,6 +84,9 @@ class PTB220_ascii:
                         self.pressure_change = float(data[3])
                     if value_checks.trend_check(int(data[4])):
                         self.pressure_trend = int(data[4])
+                # Until then use the tendency from our own pressure record
+                if self.pressure_change is None:
+                    self.pressure_change, self.pressure_trend = self.tendency.tendency()
         else:
             warnings.warn('PTB220 format not recognised', Warning)
 
@@ -82,15 +95,18 @@ class PTB220_ascii:
         Get the latest instrument readings.
         :return: JSON formatted instrument readings.
         """
+        fields = {
+            'timestamp': self.timestamp,
+            'pressure': self.pressure,
+            'pressure_change': self.pressure_change,
+            'pressure_trend': self.pressure_trend
+        }
+        # Rolling mean, min, max and standard deviation of the pressure
+        fields.update(self.stats.fields())
         return [
             {
                 'measurement': 'PTB220',
-                'fields': {
-                    'timestamp': self.timestamp,
-                    'pressure': self.pressure,
-                    'pressure_change': self.pressure_change,
-                    'pressure_trend': self.pressure_trend
-                }
+                'fields': fields
             }
         ]
 
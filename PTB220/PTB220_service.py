@@ -3,6 +3,7 @@ import os
 import logging
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from PTB220_ascii import PTB220_ascii
+from unix_http import serve_unix_socket
 
 logging.basicConfig(level=logging.INFO)
 logging.captureWarnings(True)
@@ -37,6 +38,7 @@ class PTB220http(BaseHTTPRequestHandler):
 for extraction and processing """
 if os.getenv('PTB220_ENABLE', 'false') == 'true':
     PTB220service = PTB220service()
+    serve_unix_socket('PTB220', PTB220http)
 
     while True:
         server_address = ('', 80)
@@ -0,0 +1,115 @@
+import os
+import math
+import time
+from collections import deque
+from threading import Lock
+
+
+class Window:
+    def __init__(self, seconds):
+        """Mean, minimum, maximum and standard deviation of the readings over
+        a sliding time window, each reading added and expired in O(1)
+        (amortised) time. The sums are kept relative to the first reading so
+        the variance doesn't lose precision on e.g. pressure values.
+        :param seconds: Length of the window.
+        """
+        self.seconds = seconds
+        # (sequence number, time, value) of the readings in the window
+        self.readings = deque()
+        # Monotonic queues of the candidate minimum and maximum readings
+        self.lows = deque()
+        self.highs = deque()
+        self.sequence = 0
+        self.shift = None
+        self.total = 0.0
+        self.squares = 0.0
+
+    def add(self, now, value):
+        if self.shift is None:
+            self.shift = value
+        reading = (self.sequence, now, value)
+        self.sequence += 1
+        self.readings.append(reading)
+        self.total += value - self.shift
+        self.squares += (value - self.shift) ** 2
+        while self.lows and self.lows[-1][2] >= value:
+            self.lows.pop()
+        self.lows.append(reading)
+        while self.highs and self.highs[-1][2] <= value:
+            self.highs.pop()
+        self.highs.append(reading)
+
+    def expire(self, now):
+        """Drop the readings that have fallen out of the window"""
+        while self.readings and self.readings[0][1] <= now - self.seconds:
+            sequence, observed, value = self.readings.popleft()
+            self.total -= value - self.shift
+            self.squares -= (value - self.shift) ** 2
+            if self.lows[0][0] == sequence:
+                self.lows.popleft()
+            if self.highs[0][0] == sequence:
+                self.highs.popleft()
+        if not self.readings:
+            # Start again from exact sums
+            self.shift = None
+            self.total = 0.0
+            self.squares = 0.0
+
+    def stats(self):
+        """:return: Tuple of (mean, min, max, standard deviation), all None
+        if there are no readings in the window."""
+        count = len(self.readings)
+        if not count:
+            return None, None, None, None
+        mean = self.total / count
+        variance = max(self.squares / count - mean ** 2, 0.0)
+        return self.shift + mean, self.lows[0][2], self.highs[0][2], math.sqrt(variance)
+
+
+class RollingStats:
+    def __init__(self, fields):
+        """Rolling statistics of sensor fields over each of the STATS_WINDOWS
+        (comma separated minutes, empty to disable), reported as extra
+        fields e.g. temperature_mean_10m, temperature_min_10m,
+        temperature_max_10m and temperature_std_10m.
+        :param fields: Names of the fields to keep statistics of.
+        """
+        windows = os.getenv('STATS_WINDOWS', '1,10,60')
+        self.minutes = [int(minutes) for minutes in windows.split(',') if minutes.strip()]
+        self.lock = Lock()
+        self.windows = {field: [Window(minutes * 60) for minutes in self.minutes]
+                        for field in fields}
+
+    def update(self, readings, now=None):
+        """Add the latest readings.
+        :param readings: Dictionary of field values, None values are skipped.
+        :param now: Time of the readings (epoch seconds), defaults to now.
+        """
+        now = now or time.time()
+        with self.lock:
+            for field, windows in self.windows.items():
+                value = readings.get(field)
+                for window in windows:
+                    if value is not None:
+                        window.add(now, value)
+                    window.expire(now)
+
+    def fields(self, now=None):
+        """Dictionary of the statistics of every field and window"""
+        now = now or time.time()
+        stats = dict()
+        with self.lock:
+            for field, windows in self.windows.items():
+                for minutes, window in zip(self.minutes, windows):
+                    window.expire(now)
+                    mean, low, high, deviation = window.stats()
+                    suffix = '_' + str(minutes) + 'm'
+                    stats[field + '_mean' + suffix] = rounded(mean, 2)
+                    stats[field + '_min' + suffix] = low
+                    stats[field + '_max' + suffix] = high
+                    stats[field + '_std' + suffix] = rounded(deviation, 3)
+        return stats
+
+
+def rounded(value, digits):
+    return None if value is None else round(value, digits)
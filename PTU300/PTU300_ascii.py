@@ -4,6 +4,9 @@ import re
 import os
 import serial
 import value_checks
+from mqtt_publisher import MQTTpublisher
+from pressure_tendency import PressureTendency
+from rolling_stats import RollingStats
 from datetime import datetime
 from threading import Timer
 
@@ -32,6 +35,10 @@ class PTU300_ascii:
         self.dew_point = None
         self.pressure_change = None
         self.pressure_trend = None
+        self.tendency = PressureTendency('PTU300')
+        self.stats = RollingStats(['pressure', 'temperature', 'humidity', 'dew_point'])
+
+        self.mqtt_publisher = MQTTpublisher('PTU300')
 
         self.serial_port_reader()
 
@@ -46,6 +53,7 @@ class PTU300_ascii:
                 logging.info('RAW data: ' + data_line)
                 self.data_decoder(data_line)
                 logging.info(self.get_readings())
+                self.mqtt_publisher.publish(self.get_readings())
         except serial.SerialException as error:
             warnings.warn("Serial port error: " + str(error), Warning)
         # Asynchronously schedule this function to be run again in 1.0 seconds
@@ -91,10 +99,14 @@ class PTU300_ascii:
                     pressure_change = float(data[4])
                 if len(data) > 5:
                     pressure_trend = int(data[5])
+                # Until then use the tendency from our own pressure record
+                if pressure_change is None:
+                    pressure_change, pressure_trend = self.tendency.tendency()
 
                 """ Check parameters fall within sensible limits """
                 if value_checks.pressure_check(pressure):
                     self.pressure = pressure
+                    self.tendency.update(pressure)
 
                 if value_checks.humidity_check(humidity):
                     self.humidity = humidity
@@ -111,6 +123,11 @@ class PTU300_ascii:
                 if value_checks.trend_check(pressure_trend):
                     self.pressure_trend = pressure_trend
 
+                self.stats.update({'pressure': pressure,
+                                   'temperature': temperature,
+                                   'humidity': humidity,
+                                   'dew_point': dew_point})
+
             else:
                 warnings.warn('invalid PTU300 data!', Warning)
 
@@ -119,18 +136,21 @@ class PTU300_ascii:
         Return the latest recorded values from the instrument
         :return: JSON formatted instrument readings
         """
+        fields = {
+            'timestamp': self.timestamp,
+            'pressure': self.pressure,
+            'temperature': self.temperature,
+            'dew_point': self.dew_point,
+            'humidity': self.humidity,
+            'pressure_change': self.pressure_change,
+            'pressure_trend': self.pressure_trend
+        }
+        # Rolling mean, min, max and standard deviation of each reading
+        fields.update(self.stats.fields())
         return [
             {
                 'measurement': 'PTU300',
-                'fields': {
-                    'timestamp': self.timestamp,
-                    'pressure': self.pressure,
-                    'temperature': self.temperature,
-                    'dew_point': self.dew_point,
-                    'humidity': self.humidity,
-                    'pressure_change': self.pressure_change,
-                    'pressure_trend': self.pressure_trend
-                }
+                'fields': fields
             }
         ]
 
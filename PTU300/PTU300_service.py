@@ -3,6 +3,7 @@ import os
 import logging
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from PTU300_ascii import PTU300_ascii
+from unix_http import serve_unix_socket
 # from PTU300_modbus import PTU300_modbus
 logging.basicConfig(level=logging.INFO)
 logging.captureWarnings(True)
@@ -39,6 +40,7 @@ class PTU300http(BaseHTTPRequestHandler):
 for extraction and processing """
 if os.getenv('PTU300_ENABLE', 'false') == 'true':
     PTU300service = PTU300service()
+    serve_unix_socket('PTU300', PTU300http)
 
     while True:
         server_address = ('', 80)
@@ -0,0 +1,73 @@
+import os
+import json
+import time
+import logging
+from threading import Condition, Thread
+import paho.mqtt.client as mqtt
+
+
+class MQTTpublisher:
+    def __init__(self, client_id):
+        """Publish decoded sensor readings to the local MQTT broker as
+        retained messages on a per-sensor topic e.g. 'metpod/ptb220'.
+        A single persistent connection is kept open in the background and
+        only the latest reading of each topic is held for it, so the serial
+        reader never waits on the network and a reading superseded before
+        it was sent is dropped rather than published late.
+        :param client_id: Unique MQTT client ID for this service.
+        """
+        self.enable = os.getenv('MQTT_ENABLE', 'false') == 'true'
+        self.topic_prefix = os.getenv('MQTT_TOPIC_PREFIX', 'metpod')
+        self.qos = int(os.getenv('MQTT_QOS', 0))
+        # Minimum time in seconds between publishing rounds
+        self.publish_interval = float(os.getenv('MQTT_PUBLISH_INTERVAL', 1.0))
+        # {topic: latest payload not yet published}
+        self.pending = dict()
+        self.condition = Condition()
+
+        if not self.enable:
+            return
+
+        mqtt_host = os.getenv('MQTT_HOST', 'mqtt')
+        mqtt_port = int(os.getenv('MQTT_PORT', 1883))
+
+        self.client = mqtt.Client(client_id)
+        # Bound the client's own store of unsent QoS 1/2 messages
+        self.client.max_queued_messages_set(int(os.getenv('MQTT_QUEUE_SIZE', 100)))
+        self.client.reconnect_delay_set(1, 60)
+        self.client.connect_async(mqtt_host, mqtt_port, keepalive=60)
+        self.client.loop_start()
+        logging.info('MQTT publishing to ' + mqtt_host + ':' + str(mqtt_port))
+
+        Thread(target=self.publisher, daemon=True).start()
+
+    def publish(self, readings):
+        """Hand over the latest readings for publishing, replacing any of
+        the same topic still waiting.
+        :param readings: Instrument readings as returned by get_readings().
+        """
+        if not self.enable:
+            return
+
+        with self.condition:
+            for reading in readings:
+                topic = self.topic_prefix + '/' + reading['measurement'].lower()
+                self.pending[topic] = json.dumps(reading['fields'])
+            self.condition.notify()
+
+    def publisher(self):
+        """Publish the latest reading of every topic updated since the last
+        round over the persistent connection, a round at most every publish
+        interval."""
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                pending, self.pending = self.pending, dict()
+
+            for topic, payload in pending.items():
+                result = self.client.publish(topic, payload, qos=self.qos, retain=True)
+                if result.rc != mqtt.MQTT_ERR_SUCCESS:
+                    logging.debug('MQTT publish to ' + topic + ' not sent: ' +
+                                  mqtt.error_string(result.rc))
+            time.sleep(self.publish_interval)
@@ -0,0 +1,141 @@
+import os
+import time
+import struct
+import warnings
+from threading import Lock
+
+MINUTE = 60
+# Minute slots in the ring, 3 hours plus the current minute
+SLOTS = 3 * 60 + 1
+# Each slot is the minute number (epoch minutes) and the mean pressure (hPa)
+# of that minute. A slot only holds a value for the minute it is stamped with
+# so stale slots left over from before a restart are ignored.
+SLOT = struct.Struct('<if')
+# Minutes either side of a sample time still accepted for it
+TOLERANCE = 2
+# Changes in hPa below this count as steady
+STEADY = 0.1
+
+
+class PressureTendency:
+    def __init__(self, name):
+        """3 hour pressure tendency worked out on the device, for when the
+        sensor doesn't give its own, e.g. for its first 3 hours running.
+        Pressure is kept once a minute in a fixed size ring on disk in
+        PRESSURE_RING_FILE, so after a restart the tendency is available
+        again straight away as long as the last 3 hours are still there.
+        Each minute is written in place, so the file stays a constant small
+        size and there is nothing to replay on start up.
+        :param name: Sensor name, used for the default ring file name.
+        """
+        self.path = os.getenv('PRESSURE_RING_FILE', '/data/' + name.lower() + '_pressure.ring')
+        self.lock = Lock()
+        self.ring = [(0, 0.0)] * SLOTS
+        self.file = None
+        # Sum and count of the pressure readings of the current minute
+        self.minute = None
+        self.total = 0.0
+        self.count = 0
+        self.open()
+
+    def open(self):
+        """Open the ring file, creating it if needed, and read it in"""
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.file = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            data = os.pread(self.file, SLOT.size * SLOTS, 0)
+            if len(data) != SLOT.size * SLOTS:
+                os.ftruncate(self.file, SLOT.size * SLOTS)
+                data = data.ljust(SLOT.size * SLOTS, b'\0')
+            self.ring = [SLOT.unpack_from(data, slot * SLOT.size) for slot in range(SLOTS)]
+        except OSError as e:
+            self.file = None
+            warnings.warn('Pressure ring ' + self.path + ' unavailable, tendency kept in memory: '
+                          + str(e), Warning)
+
+    def update(self, pressure, now=None):
+        """Add a pressure reading, averaged into its minute's slot.
+        :param pressure: Pressure (hPa).
+        :param now: Time of the reading (epoch seconds), defaults to now.
+        """
+        minute = int((now or time.time()) // MINUTE)
+        with self.lock:
+            if minute != self.minute:
+                self.minute = minute
+                self.total = 0.0
+                self.count = 0
+            self.total += pressure
+            self.count += 1
+            self.store(minute, self.total / self.count)
+
+    def store(self, minute, pressure):
+        slot = minute % SLOTS
+        self.ring[slot] = (minute, pressure)
+        if self.file is None:
+            return
+        try:
+            os.pwrite(self.file, SLOT.pack(minute, pressure), slot * SLOT.size)
+        except OSError as e:
+            warnings.warn('Unable to write pressure ring ' + self.path + ': ' + str(e), Warning)
+
+    def pressure_at(self, minute):
+        """The pressure recorded nearest to a minute, within the tolerance"""
+        for offset in sorted(range(-TOLERANCE, TOLERANCE + 1), key=abs):
+            stamp, pressure = self.ring[(minute + offset) % SLOTS]
+            if stamp == minute + offset:
+                return pressure
+        return None
+
+    def tendency(self, now=None):
+        """The 3 hour pressure change and the WMO characteristic of pressure
+        tendency (code table 0200) over it.
+        :param now: Time (epoch seconds), defaults to now.
+        :return: Tuple of (change hPa, code 0-8), (None, None) until there
+        are readings from 3 hours ago.
+        """
+        minute = int((now or time.time()) // MINUTE)
+        with self.lock:
+            current = self.pressure_at(minute)
+            middle = self.pressure_at(minute - 90)
+            start = self.pressure_at(minute - 180)
+        if current is None or start is None:
+            return None, None
+        change = round(current - start, 1)
+        if middle is None:
+            # No shape to go on, a steady rise or fall
+            return change, 2 if change >= STEADY else 7 if change <= -STEADY else 4
+        return change, characteristic(middle - start, current - middle)
+
+
+def characteristic(first, second):
+    """WMO characteristic of pressure tendency from the pressure changes over
+    the first and second halves of the 3 hour period.
+    :param first: Change (hPa) over the first 90 minutes.
+    :param second: Change (hPa) over the last 90 minutes.
+    :return: Code 0-8 of WMO code table 0200.
+    """
+    change = first + second
+    rising = first >= STEADY, second >= STEADY
+    falling = first <= -STEADY, second <= -STEADY
+
+    if abs(change) < STEADY:
+        if rising[0] and falling[1]:
+            return 0  # Increasing then decreasing, same as 3 hours ago
+        if falling[0] and rising[1]:
+            return 5  # Decreasing then increasing, same as 3 hours ago
+        return 4  # Steady
+    if change > 0:
+        if falling[1]:
+            return 0  # Increasing then decreasing, higher
+        if rising[0] and (not rising[1] or second < first / 2):
+            return 1  # Increasing then steady or more slowly
+        if rising[1] and (not rising[0] or second > first * 2):
+            return 3  # Steady or decreasing then increasing, or more rapidly
+        return 2  # Increasing
+    if rising[1]:
+        return 5  # Decreasing then increasing, lower
+    if falling[0] and (not falling[1] or second > first / 2):
+        return 6  # Decreasing then steady or more slowly
+    if falling[1] and (not falling[0] or second < first * 2):
+        return 8  # Steady or increasing then decreasing, or more rapidly
+    return 7  # Decreasing
@@ -2,9 +2,10 @@ import warnings
 import logging
 import re
 import os
-import requests
 import serial
 import value_checks
+from mqtt_publisher import MQTTpublisher
+from tip_forwarder import TipForwarder
 from datetime import datetime
 from threading import Timer
 
@@ -24,6 +25,7 @@ class RAINGAUGE_ascii:
         self.rainrate = 0.0
         self.raintip = 0.0
         self.timestamp = None
+        self.tip_forwarder = TipForwarder('http://rainfall/batch')
 
         self.serial_port_name = os.getenv('RAINGAUGE_PORT', '/dev/ttyUSB0')
         self.serial_baud = os.getenv('RAINGAUGE_BAUD', 9600)
@@ -31,6 +33,8 @@ class RAINGAUGE_ascii:
         logging.info('Serial port: ' + str(self.serial_port))
         logging.info('Sensor mode: ascii')
 
+        self.mqtt_publisher = MQTTpublisher('RAINGAUGE')
+
         self.serial_port_reader()
 
     def serial_port_reader(self):
@@ -44,6 +48,7 @@ class RAINGAUGE_ascii:
                 logging.info('RAW data: ' + data_line)
                 self.data_decoder(data_line)
                 logging.info(self.get_readings())
+                self.mqtt_publisher.publish(self.get_readings())
         except serial.SerialException as error:
             warnings.warn("Serial port error: " + str(error), Warning)
         # Asynchronously schedule this function to be run every 1 seconds
@@ -65,7 +70,8 @@ class RAINGAUGE_ascii:
 
             """ Check parameters fall within sensible limits """
             if value_checks.rain_rate_check(self.rainrate):
-                requests.post('http://rainfall', data=str(self.raintip), timeout=5)
+                if self.raintip > 0:
+                    self.tip_forwarder.tip(self.raintip)
             else:
                 warnings.warn('invalid Raingauge data!', Warning)
 
@@ -3,6 +3,7 @@ import os
 import logging
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from RAINGAUGE_ascii import RAINGAUGE_ascii
+from unix_http import serve_unix_socket
 
 logging.basicConfig(level=logging.INFO)
 logging.captureWarnings(True)
@@ -37,6 +38,7 @@ class RAINGAUGEhttp(BaseHTTPRequestHandler):
 for extraction and processing """
 if os.getenv('RAINGAUGE_ENABLE', 'false') == 'true':
     RAINGAUGEservice = RAINGAUGEservice()
+    serve_unix_socket('RAINGAUGE', RAINGAUGEhttp)
 
     while True:
         server_address = ('', 80)
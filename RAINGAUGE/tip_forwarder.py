@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import logging
+import warnings
+import requests
+import local_socket
+from collections import deque
+from threading import Condition, Thread
+
+
+class TipForwarder:
+    def __init__(self, url):
+        """Forward rain gauge tips to the rainfall service off the serial
+        reader thread. Tips are queued and a background thread posts them
+        in batches of up to RAINFALL_BATCH_SIZE, waiting RAINFALL_BATCH_DELAY
+        seconds after a tip for any more to arrive, over the shared session's
+        kept alive connection. A batch stays queued until the rainfall
+        service has accepted it and is retried with backoff until it is, so
+        every tip is delivered at least once. A batch the rainfall service
+        rejects as invalid (a 4xx status other than 408 or 429) would be
+        rejected again, so it is reported and dropped rather than holding up
+        the tips behind it. Each tip carries an ID unique to this run and tip
+        so the rainfall service can ignore repeats. Up to RAINFALL_QUEUE_SIZE
+        tips are held while the rainfall service is unavailable, the oldest
+        are dropped beyond that.
+        The queue is kept in the log RAINFALL_QUEUE_FILE, each tip appended
+        and synced to disk before it is queued and the IDs of the tips sent
+        appended once accepted, so tips not yet accepted are recovered and
+        sent after a restart. The log is emptied whenever the queue is and
+        rewritten with just the queued tips if it grows too long.
+        :param url: URL of the rainfall service batch endpoint.
+        """
+        self.url = url
+        self.batch_size = int(os.getenv('RAINFALL_BATCH_SIZE', 50))
+        self.batch_delay = float(os.getenv('RAINFALL_BATCH_DELAY', 1.0))
+        self.max_backoff = 60
+        self.queue = deque(maxlen=int(os.getenv('RAINFALL_QUEUE_SIZE', 10000)))
+        self.condition = Condition()
+
+        self.path = os.getenv('RAINFALL_QUEUE_FILE', '/data/rain_tips.log')
+        self.file = None
+        # Lines in the log, it is rewritten once these pass twice the queue size
+        self.lines = 0
+        self.recover()
+
+        self.run_id = str(int(time.time()))
+        self.tip_number = 0
+
+        Thread(target=self.forwarder, daemon=True).start()
+
+    def recover(self):
+        """Restore the tips not yet accepted from the queue log"""
+        try:
+            with open(self.path) as log_file:
+                for line in log_file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line part written by a crash
+                        continue
+                    self.lines += 1
+                    if 'sent' in entry:
+                        self.remove(set(entry['sent']))
+                    else:
+                        self.queue.append(entry)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            warnings.warn('Unable to read rain tip queue ' + self.path + ': ' + str(e), Warning)
+        if self.queue:
+            logging.info(str(len(self.queue)) + ' unsent rain tips recovered')
+        # Start the log again from the recovered tips
+        self.rewrite()
+
+    def remove(self, sent):
+        """Remove sent tips from the head of the queue. The lock must be held
+        once the forwarder is running.
+        :param sent: Set of the IDs of the tips sent.
+        """
+        # Tips dropped from a full queue meanwhile were sent already
+        while self.queue and self.queue[0]['tip_id'] in sent:
+            self.queue.popleft()
+
+    def log(self, entry):
+        """Append an entry to the queue log and sync it to disk. The lock
+        must be held."""
+        try:
+            if self.file is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self.file = open(self.path, 'a')
+            self.file.write(json.dumps(entry) + '\n')
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.lines += 1
+        except OSError as e:
+            warnings.warn('Unable to write rain tip queue ' + self.path + ': ' + str(e), Warning)
+
+    def rewrite(self):
+        """Replace the queue log with one of just the queued tips. The lock
+        must be held once the forwarder is running."""
+        try:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w') as log_file:
+                log_file.writelines(json.dumps(tip) + '\n' for tip in self.queue)
+                log_file.flush()
+                os.fsync(log_file.fileno())
+            os.replace(temp_path, self.path)
+            self.lines = len(self.queue)
+        except OSError as e:
+            warnings.warn('Unable to rewrite rain tip queue ' + self.path + ': ' + str(e), Warning)
+
+    def tip(self, raintip):
+        """Queue a tip for forwarding.
+        :param raintip: Rain (mm) of the tip.
+        """
+        with self.condition:
+            self.tip_number += 1
+            if len(self.queue) == self.queue.maxlen:
+                warnings.warn('Rain tip queue full, oldest tip dropped', Warning)
+            tip = {'tip_id': self.run_id + '-' + str(self.tip_number),
+                   'raintip': raintip,
+                   'time': time.time()}
+            self.log(tip)
+            self.queue.append(tip)
+            self.condition.notify()
+
+    def forwarder(self):
+        """Post the queued tips in batches, removing them from the queue
+        once accepted"""
+        backoff = 1
+        while True:
+            with self.condition:
+                while not self.queue:
+                    self.condition.wait()
+                waiting = len(self.queue)
+            if waiting < self.batch_size:
+                # Give any more tips of the same burst of rain time to arrive
+                time.sleep(self.batch_delay)
+            with self.condition:
+                batch = [self.queue[index] for index in range(min(len(self.queue), self.batch_size))]
+
+            try:
+                response = local_socket.post(self.url, data=json.dumps(batch), timeout=5)
+                if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+                    warnings.warn('Rainfall service rejected ' + str(len(batch)) +
+                                  ' rain tips with status ' + str(response.status_code) + ': ' +
+                                  response.text[:200], Warning)
+                else:
+                    response.raise_for_status()
+            except requests.RequestException as error:
+                warnings.warn('Rain tip forwarding failed, retrying in ' + str(backoff) + ' s: ' +
+                              str(error), Warning)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+
+            backoff = 1
+            with self.condition:
+                self.remove({tip['tip_id'] for tip in batch})
+                if not self.queue or self.lines > 2 * self.queue.maxlen:
+                    self.rewrite()
+                else:
+                    self.log({'sent': [tip['tip_id'] for tip in batch]})
+            if response.ok:
+                logging.info('Forwarded ' + str(len(batch)) + ' rain tips')
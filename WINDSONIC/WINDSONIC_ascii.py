@@ -4,6 +4,7 @@ import re
 import os
 import serial
 import value_checks
+from mqtt_publisher import MQTTpublisher
 from datetime import datetime
 from threading import Timer
 from wind_processor import WindProcessor
@@ -37,6 +38,8 @@ class WINDSONIC_ascii:
         self.windgust = None
         self.wind_processor = WindProcessor()
 
+        self.mqtt_publisher = MQTTpublisher('WINDSONIC')
+
         self.serial_port_reader()
 
     def serial_port_reader(self):
@@ -50,6 +53,7 @@ class WINDSONIC_ascii:
                 logging.info('RAW data: ' + data_line)
                 self.data_decoder(data_line)
                 logging.info(self.get_readings())
+                self.mqtt_publisher.publish(self.get_readings())
         except serial.SerialException as error:
             warnings.warn("Serial port error: " + str(error), Warning)
         # Asynchronously schedule this function to be run again in 1.0 seconds
@@ -3,6 +3,7 @@ import os
 import logging
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from WINDSONIC_ascii import WINDSONIC_ascii
+from unix_http import serve_unix_socket
 
 logging.basicConfig(level=logging.INFO)
 logging.captureWarnings(True)
@@ -37,6 +38,7 @@ class WINDSONIChttp(BaseHTTPRequestHandler):
 for extraction and processing """
 if os.getenv('WINDSONIC_ENABLE', 'false') == 'true':
     WINDSONICservice = WINDSONICservice()
+    serve_unix_socket('WINDSONIC', WINDSONIChttp)
 
     while True:
         server_address = ('', 80)
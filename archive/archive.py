@@ -0,0 +1,262 @@
+import os
+import re
+import time
+import sqlite3
+import logging
+import warnings
+from threading import Lock
+
+# Retention tiers as (table, bucket seconds), raw readings first
+TIERS = (('raw', 1), ('minute', 60), ('hour', 3600))
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS series (
+    id INTEGER PRIMARY KEY,
+    sensor TEXT NOT NULL,
+    field TEXT NOT NULL,
+    UNIQUE (sensor, field));
+CREATE TABLE IF NOT EXISTS raw (
+    series INTEGER NOT NULL,
+    time INTEGER NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (series, time)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS minute (
+    series INTEGER NOT NULL,
+    time INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    sum REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    PRIMARY KEY (series, time)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS hour (
+    series INTEGER NOT NULL,
+    time INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    sum REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    PRIMARY KEY (series, time)) WITHOUT ROWID;
+'''
+
+# Add a batch of bucket statistics to those already stored
+ROLLUP = '''INSERT INTO {0} (series, time, count, sum, min, max) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (series, time) DO UPDATE SET
+    count = count + excluded.count,
+    sum = sum + excluded.sum,
+    min = min(min, excluded.min),
+    max = max(max, excluded.max)'''
+
+
+class Archive:
+    def __init__(self):
+        """Local time series archive of every sensor reading, in the SQLite
+        database ARCHIVE_FILE. Numeric fields are stored as series of
+        (time, value), one per sensor and field, in three retention tiers:
+        - raw readings, kept for ARCHIVE_RAW_DAYS
+        - 1 minute rollups (count, sum, min, max), ARCHIVE_MINUTE_DAYS
+        - hourly rollups, ARCHIVE_HOUR_DAYS
+        Readings are queued and written every flush in one transaction,
+        with the rollups added to incrementally from the same batch rather
+        than worked out again from the raw readings. Every table is keyed
+        on (series, time) so reads and pruning of a time range use the
+        index. Fields matching ARCHIVE_EXCLUDE (by default the sensors'
+        rolling statistics, which the rollups cover) aren't archived.
+        """
+        self.path = os.getenv('ARCHIVE_FILE', '/data/archive.db')
+        self.retention = {'raw': float(os.getenv('ARCHIVE_RAW_DAYS', 7)),
+                          'minute': float(os.getenv('ARCHIVE_MINUTE_DAYS', 180)),
+                          'hour': float(os.getenv('ARCHIVE_HOUR_DAYS', 3650))}
+        self.exclude = re.compile(os.getenv('ARCHIVE_EXCLUDE', r'_(mean|min|max|std)_\d+[mh]$'))
+
+        self.lock = Lock()
+        # Readings waiting to be written, (sensor, observed time, fields)
+        self.queue = []
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+        self.db_lock = Lock()
+
+        # {(sensor, field): series id}
+        self.series = dict()
+        # Time of the latest reading of each series, so repeats of a
+        # reading (e.g. retained MQTT messages on reconnecting) are skipped
+        self.latest = dict()
+        self.load_series()
+        logging.info('Archive ' + self.path + ' open, ' + str(len(self.series)) + ' series')
+
+    def load_series(self):
+        self.series = {(sensor, field): series for series, sensor, field
+                       in self.db.execute('SELECT id, sensor, field FROM series')}
+        self.latest = {series: self.db.execute('SELECT max(time) FROM raw WHERE series = ?',
+                                               (series,)).fetchone()[0] or 0
+                       for series in self.series.values()}
+
+    def add(self, sensor, observed, fields):
+        """Queue a sensor reading to be archived.
+        :param sensor: Sensor name e.g. 'ptu300'.
+        :param observed: Time of the reading (epoch seconds).
+        :param fields: Dictionary of the reading fields.
+        """
+        with self.lock:
+            self.queue.append((sensor, int(observed), fields))
+
+    def series_id(self, sensor, field):
+        key = (sensor, field)
+        if key not in self.series:
+            cursor = self.db.execute('INSERT INTO series (sensor, field) VALUES (?, ?)', key)
+            self.series[key] = cursor.lastrowid
+            self.latest[cursor.lastrowid] = 0
+        return self.series[key]
+
+    def flush(self):
+        """Write the queued readings and their rollups in one transaction"""
+        with self.lock:
+            queue, self.queue = self.queue, []
+        if not queue:
+            return
+
+        raw = []
+        # {(tier, series, bucket): [count, sum, min, max]}
+        buckets = dict()
+        with self.db_lock:
+            try:
+                with self.db:
+                    for sensor, observed, fields in queue:
+                        for field, value in fields.items():
+                            if not is_number(value) or self.exclude.search(field):
+                                continue
+                            series = self.series_id(sensor, field)
+                            if observed <= self.latest[series]:
+                                continue
+                            self.latest[series] = observed
+                            raw.append((series, observed, value))
+                            for tier, seconds in TIERS[1:]:
+                                key = (tier, series, observed - observed % seconds)
+                                bucket = buckets.get(key)
+                                if bucket is None:
+                                    buckets[key] = [1, value, value, value]
+                                else:
+                                    bucket[0] += 1
+                                    bucket[1] += value
+                                    bucket[2] = min(bucket[2], value)
+                                    bucket[3] = max(bucket[3], value)
+
+                    self.db.executemany('INSERT OR REPLACE INTO raw (series, time, value) '
+                                        'VALUES (?, ?, ?)', raw)
+                    for tier, seconds in TIERS[1:]:
+                        self.db.executemany(ROLLUP.format(tier),
+                                            [(series, bucket, *stats) for (name, series, bucket), stats
+                                             in buckets.items() if name == tier])
+            except sqlite3.Error as e:
+                warnings.warn('Unable to write ' + str(len(queue)) + ' readings to the archive: ' +
+                              str(e), Warning)
+                # Forget series and times of the rolled back transaction
+                self.load_series()
+
+    def prune(self, now=None):
+        """Delete the readings older than each tier's retention, a series
+        at a time so each delete is a range of the index"""
+        now = now or time.time()
+        with self.db_lock:
+            try:
+                with self.db:
+                    for tier, seconds in TIERS:
+                        oldest = int(now - self.retention[tier] * 86400)
+                        for series in self.series.values():
+                            self.db.execute('DELETE FROM ' + tier + ' WHERE series = ? AND time < ?',
+                                            (series, oldest))
+            except sqlite3.Error as e:
+                warnings.warn('Unable to prune the archive: ' + str(e), Warning)
+
+    def tier(self, start, interval=None, now=None):
+        """The tier to read a time range from, the coarsest one fine enough
+        for the interval out of those still holding readings from the start.
+        :param start: Start of the range (epoch seconds).
+        :param interval: Interval (seconds) the readings are wanted at,
+        None for the finest available.
+        :return: Tier name.
+        """
+        age = ((now or time.time()) - start) / 86400
+        kept = [(tier, seconds) for tier, seconds in TIERS if age <= self.retention[tier]]
+        if not kept:
+            return TIERS[-1][0]
+        fine_enough = [tier for tier, seconds in kept if interval is not None and seconds <= interval]
+        return fine_enough[-1] if fine_enough else kept[0][0]
+
+    def read(self, sensor, field, start, end, tier='raw'):
+        """Read a series over a time range of a tier.
+        :param sensor: Sensor name e.g. 'ptu300'.
+        :param field: Field name e.g. 'temperature'.
+        :param start: Start time (epoch seconds), inclusive, or for the
+        rollups the start of the bucket holding it.
+        :param end: End time (epoch seconds), exclusive.
+        :param tier: 'raw', 'minute' or 'hour'.
+        :return: List of (time, value) for raw readings, or
+        (time, count, sum, min, max) for the rollups.
+        """
+        series = self.series.get((sensor, field))
+        if series is None or tier not in dict(TIERS):
+            return []
+        columns = 'time, value' if tier == 'raw' else 'time, count, sum, min, max'
+        with self.db_lock:
+            return self.db.execute('SELECT ' + columns + ' FROM ' + tier +
+                                   ' WHERE series = ? AND time >= ? AND time < ? ORDER BY time',
+                                   (series, bucket_start(start, tier), int(end))).fetchall()
+
+    def aggregate(self, sensor, field, start, end, interval, tier):
+        """Statistics of a series over a time range in buckets of an
+        interval, worked out in the database from a tier's rollups.
+        :param sensor: Sensor name e.g. 'ptu300'.
+        :param field: Field name e.g. 'temperature'.
+        :param start: Start time (epoch seconds), inclusive, or for the
+        rollups the start of the bucket holding it.
+        :param end: End time (epoch seconds), exclusive.
+        :param interval: Bucket length (seconds), buckets start at multiples
+        of it.
+        :param tier: 'raw', 'minute' or 'hour'.
+        :return: List of (bucket time, count, sum, min, max).
+        """
+        series = self.series.get((sensor, field))
+        if series is None or tier not in dict(TIERS):
+            return []
+        if tier == 'raw':
+            columns = 'count(*), sum(value), min(value), max(value)'
+        else:
+            columns = 'sum(count), sum(sum), min(min), max(max)'
+        interval = max(int(interval), 1)
+        with self.db_lock:
+            return self.db.execute('SELECT time / ? * ? AS bucket, ' + columns + ' FROM ' + tier +
+                                   ' WHERE series = ? AND time >= ? AND time < ?'
+                                   ' GROUP BY bucket ORDER BY bucket',
+                                   (interval, interval, series, bucket_start(start, tier),
+                                    int(end))).fetchall()
+
+    def fields(self, sensor):
+        """Names of the archived fields of a sensor"""
+        return sorted(field for name, field in list(self.series) if name == sensor)
+
+    def sensors(self):
+        """Names of the archived sensors"""
+        return sorted({sensor for sensor, field in list(self.series)})
+
+    def status(self):
+        """Dictionary of the archived series and queue length"""
+        with self.lock:
+            queued = len(self.queue)
+        return {'file': self.path,
+                'retention_days': self.retention,
+                'queued': queued,
+                'series': sorted(sensor + '.' + field for sensor, field in self.series)}
+
+
+def bucket_start(start, tier):
+    """The start of a range rounded down to the start of the tier's bucket
+    holding it, rollups being stored at the start of their bucket"""
+    return int(start) - int(start) % dict(TIERS)[tier]
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import calendar
+import logging
+import warnings
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from apscheduler.schedulers.background import BackgroundScheduler
+import paho.mqtt.client as mqtt
+from archive import Archive
+from influx_query import InfluxQuery
+from unix_http import serve_unix_socket
+
+logging.basicConfig(level=logging.INFO)
+logging.captureWarnings(True)
+
+
+class ARCHIVEservice:
+    def __init__(self):
+        """Archive every reading the sensor and rainfall services publish to
+        the local MQTT broker (e.g. 'metpod/ptu300'), writing them in
+        batches every ARCHIVE_FLUSH_INTERVAL seconds."""
+        self.archive = Archive()
+        self.influx = InfluxQuery(self.archive)
+        self.topic_prefix = os.getenv('MQTT_TOPIC_PREFIX', 'metpod')
+        self.qos = int(os.getenv('MQTT_QOS', 0))
+
+        self.scheduler = BackgroundScheduler()
+        self.scheduler.add_job(self.archive.flush, 'interval',
+                               seconds=float(os.getenv('ARCHIVE_FLUSH_INTERVAL', 5)),
+                               max_instances=1, coalesce=True)
+        self.scheduler.add_job(self.archive.prune, 'interval', hours=1,
+                               max_instances=1, coalesce=True)
+
+        mqtt_host = os.getenv('MQTT_HOST', 'mqtt')
+        mqtt_port = int(os.getenv('MQTT_PORT', 1883))
+        self.client = mqtt.Client('archive')
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+        self.client.reconnect_delay_set(1, 60)
+        self.client.connect_async(mqtt_host, mqtt_port, keepalive=60)
+        self.client.loop_start()
+        logging.info('Archive subscribing to ' + mqtt_host + ':' + str(mqtt_port))
+
+    def on_connect(self, client, userdata, flags, rc):
+        """(Re)subscribe to all sensor topics whenever the connection to the
+        broker is made."""
+        client.subscribe(self.topic_prefix + '/+', self.qos)
+
+    def on_message(self, client, userdata, message):
+        """Queue a received sensor reading for archiving"""
+        sensor = message.topic.rsplit('/', 1)[-1]
+        try:
+            fields = json.loads(message.payload)
+        except ValueError:
+            warnings.warn('Invalid reading on topic ' + message.topic, Warning)
+            return
+        self.archive.add(sensor, reading_time(fields.get('timestamp')), fields)
+
+    def get_series(self, query):
+        """Read an archived series.
+        :param query: Dictionary of the sensor, field, start and end (epoch
+        seconds, default the last hour) and tier (default the finest still
+        holding the start).
+        """
+        end = float(query.get('end', time.time()))
+        start = float(query.get('start', end - 3600))
+        tier = query.get('tier') or self.archive.tier(start)
+        return {'sensor': query['sensor'], 'field': query['field'], 'tier': tier,
+                'values': self.archive.read(query['sensor'], query['field'], start, end, tier)}
+
+
+def reading_time(timestamp):
+    """Convert a reading timestamp e.g. '2020-06-01T12:00:00Z' to epoch
+    seconds, using the current time for readings without one."""
+    try:
+        return calendar.timegm(time.strptime(timestamp, '%Y-%m-%dT%H:%M:%SZ'))
+    except (TypeError, ValueError):
+        return time.time()
+
+
+class ARCHIVEhttp(BaseHTTPRequestHandler):
+    """Archive:
+    /status - archive file, retention and archived series
+    /series?sensor=ptu300&field=temperature&start=&end=&tier= - readings of
+    a series, raw as [time, value] or rollups as [time, count, sum, min, max]
+    /query?q=SELECT ...&epoch=ms - InfluxDB compatible query, see
+    influx_query.py, also POSTed as a form
+    /ping - InfluxDB compatible health check
+    """
+    def _set_headers(self, status=200):
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('X-Influxdb-Version', '1.8-metpod')
+        self.end_headers()
+
+    def do_POST(self):
+        content_length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(content_length).decode('UTF-8', errors='replace')
+        url = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        query.update({key: values[-1] for key, values in parse_qs(body).items()})
+        if url.path.rstrip('/') != '/query':
+            self._set_headers(404)
+            return
+        self.send_query(query)
+
+    def send_query(self, query):
+        if 'q' not in query:
+            self._set_headers(400)
+            self.wfile.write(json.dumps({'error': 'missing required parameter "q"'}).encode('UTF-8'))
+            return
+        result = ARCHIVEservice.influx.query(query['q'], query.get('epoch'))
+        self._set_headers()
+        self.wfile.write(json.dumps(result).encode('UTF-8'))
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = url.path.rstrip('/')
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if path == '/ping':
+            self._set_headers(204)
+            return
+        if path == '/query':
+            self.send_query(query)
+            return
+        try:
+            if path == '/status':
+                result = ARCHIVEservice.archive.status()
+            elif path == '/series':
+                result = ARCHIVEservice.get_series(query)
+            else:
+                self._set_headers(404)
+                return
+        except (KeyError, ValueError) as error:
+            self._set_headers(400)
+            self.wfile.write(json.dumps({'error': str(error)}).encode('UTF-8'))
+            return
+        self._set_headers()
+        self.wfile.write(json.dumps(result).encode('UTF-8'))
+
+
+""" Start the archive and the server that answers queries of it """
+if __name__ == '__main__':
+    ARCHIVEservice = ARCHIVEservice()
+    ARCHIVEservice.scheduler.start()
+    logging.info('Archive service running')
+
+    serve_unix_socket('archive', ARCHIVEhttp)
+
+    while True:
+        server_address = ('', int(os.getenv('ARCHIVE_HTTP_PORT', 80)))
+        httpd = ThreadingHTTPServer(server_address, ARCHIVEhttp)
+        logging.info('Archive HTTP server running')
+        httpd.serve_forever()
@@ -0,0 +1,320 @@
+import os
+import re
+import math
+import time
+import calendar
+from datetime import datetime
+
+# Line protocol field names of the station observation values as written to
+# Corlysis by the uploader (see uploader/sinks/corlysis.py)
+CORLYSIS_FIELDS = (('temperature', 'tempc'), ('QNH', 'qnh'), ('QFE', 'qfe'),
+                   ('pressure', 'pressure'), ('tendency', 'tendency'),
+                   ('humidity', 'humidity'), ('dewpoint', 'dewptc'),
+                   ('rainrate', 'rainrate'), ('dailyrain', 'dailyrainmm'),
+                   ('windgust', 'windgustkts'), ('winddir', 'winddir_avg10m'),
+                   ('windspd', 'windspd_avg10m'), ('daymax', 'day_max'),
+                   ('nightmin', 'night_min'))
+
+# Seconds of the InfluxQL duration units
+DURATIONS = {'ns': 1e-9, 'u': 1e-6, 'µ': 1e-6, 'ms': 1e-3, 's': 1, 'm': 60, 'h': 3600,
+             'd': 86400, 'w': 604800}
+AGGREGATES = ('mean', 'max', 'min', 'sum', 'count')
+# Most raw readings returned by a query without GROUP BY time()
+RAW_LIMIT = 10000
+
+SELECT_PATTERN = re.compile(
+    r'^SELECT\s+(?P<fields>.+?)\s+FROM\s+(?P<measurement>\S+)'
+    r'(?:\s+WHERE\s+(?P<where>.+?))?'
+    r'(?:\s+GROUP\s+BY\s+(?P<group>.+?))?'
+    r'(?:\s+fill\((?P<fill>[^)]*)\))?'
+    r'(?:\s+ORDER\s+BY\s+time\s+(?P<order>ASC|DESC))?'
+    r'(?:\s+LIMIT\s+(?P<limit>\d+))?\s*$', re.IGNORECASE | re.DOTALL)
+FIELD_PATTERN = re.compile(r'^(?:(?P<function>\w+)\(\s*(?P<inner>[^)]+?)\s*\)|(?P<plain>.+?))'
+                           r'(?:\s+AS\s+(?P<alias>\S+))?$', re.IGNORECASE)
+TIME_PATTERN = re.compile(r'time\s*(?P<op>>=|<=|>|<|=)\s*(?P<value>now\(\)(?:\s*[-+]\s*\d+[a-zµ]+)?'
+                          r'|\'[^\']+\'|\d+[a-zµ]*)', re.IGNORECASE)
+GROUP_TIME_PATTERN = re.compile(r'time\(\s*(\d+[a-zµ]+)\s*\)', re.IGNORECASE)
+
+
+class QueryError(Exception):
+    pass
+
+
+class InfluxQuery:
+    def __init__(self, archive):
+        """A small InfluxDB compatible query API over the archive, enough
+        for e.g. Grafana dashboards to read the station locally with the
+        same queries they make of Corlysis:
+        SELECT mean("temperature"), max("windgust") FROM "<SITE_ID>"
+            WHERE time > now() - 7d GROUP BY time(1h) fill(null)
+        The SITE_ID measurement has the Corlysis field names of the station
+        observation, and each sensor (e.g. "ptu300") is a measurement of
+        its own archived fields. Aggregates (mean, max, min, sum, count)
+        are worked out from the coarsest rollup tier fine enough for the
+        GROUP BY interval, so queries over long ranges stay quick. SHOW
+        DATABASES, MEASUREMENTS and FIELD KEYS are answered for the query
+        editor, other statements are not supported.
+        :param archive: The Archive to query.
+        """
+        self.archive = archive
+        self.measurement = os.getenv('SITE_ID', 'metpod')
+        self.database = os.getenv('CORLYSIS_DB', 'metpod')
+        self.station_fields = dict(CORLYSIS_FIELDS)
+
+    def query(self, text, epoch=None, now=None):
+        """Run the statements of a query.
+        :param text: InfluxQL statements, separated by semicolons.
+        :param epoch: Precision of the returned times (e.g. 'ms'), RFC3339
+        strings if None.
+        :return: Dictionary of the results in the InfluxDB response format.
+        """
+        now = now or time.time()
+        results = []
+        statements = [statement.strip() for statement in text.split(';') if statement.strip()]
+        for statement_id, statement in enumerate(statements):
+            try:
+                result = self.statement(statement, epoch, now)
+            except QueryError as error:
+                result = {'error': str(error)}
+            result['statement_id'] = statement_id
+            results.append(result)
+        return {'results': results}
+
+    def statement(self, statement, epoch, now):
+        words = statement.upper().split()
+        if words[:2] == ['SHOW', 'DATABASES']:
+            return series('databases', ['name'], [[self.database]])
+        if words[:2] == ['SHOW', 'MEASUREMENTS']:
+            names = [self.measurement] + self.archive.sensors()
+            return series('measurements', ['name'], [[name] for name in names])
+        if words[:3] == ['SHOW', 'FIELD', 'KEYS']:
+            match = re.search(r'\bFROM\s+(\S+)', statement, re.IGNORECASE)
+            names = [measurement_name(match.group(1))] if match else \
+                [self.measurement] + self.archive.sensors()
+            return {'series': [{'name': name, 'columns': ['fieldKey', 'fieldType'],
+                                'values': [[field, 'float'] for field in self.field_keys(name)]}
+                               for name in names]}
+        if words[:1] == ['SHOW']:
+            # e.g. tag keys and values, there are no tags
+            return {}
+        if words[:1] == ['SELECT']:
+            return self.select(statement, epoch, now)
+        raise QueryError('unsupported statement: ' + statement)
+
+    def field_keys(self, measurement):
+        if measurement == self.measurement:
+            return [field for field, key in CORLYSIS_FIELDS]
+        return self.archive.fields(measurement)
+
+    def archived(self, measurement, field):
+        """The archived (sensor, field) of a measurement field"""
+        if measurement == self.measurement:
+            if field not in self.station_fields:
+                raise QueryError('unknown field ' + field)
+            return 'station', self.station_fields[field]
+        return measurement, field
+
+    def select(self, statement, epoch, now):
+        match = SELECT_PATTERN.match(statement)
+        if not match:
+            raise QueryError('unable to parse: ' + statement)
+        measurement = measurement_name(match.group('measurement'))
+        start, end = time_range(match.group('where') or '', now)
+        columns = [parse_field(field) for field in split_fields(match.group('fields'))]
+        group = GROUP_TIME_PATTERN.search(match.group('group') or '')
+        descending = (match.group('order') or '').upper() == 'DESC'
+        limit = int(match.group('limit')) if match.group('limit') else None
+
+        if group:
+            interval = max(int(duration(group.group(1))), 1)
+            rows = self.grouped(measurement, columns, start, end, interval,
+                                (match.group('fill') or 'null').strip().lower(), now)
+        else:
+            rows = self.raw(measurement, columns, start, end)
+        if descending:
+            rows.reverse()
+        if limit is not None:
+            rows = rows[:limit]
+        if not rows:
+            return {}
+        names = column_names(columns)
+        return series(measurement, ['time'] + names,
+                      [[format_time(row[0], epoch)] + row[1:] for row in rows])
+
+    def grouped(self, measurement, columns, start, end, interval, fill, now):
+        """Rows of aggregates of each GROUP BY time() bucket"""
+        if start is None:
+            raise QueryError('GROUP BY time() needs a lower time bound')
+        end = end if end is not None else now
+        tier = self.archive.tier(start, interval, now)
+        buckets = dict()
+        for index, (function, field, alias) in enumerate(columns):
+            if function not in AGGREGATES:
+                raise QueryError('GROUP BY time() needs an aggregate of ' + field)
+            sensor, archived = self.archived(measurement, field)
+            for bucket, count, total, low, high in self.archive.aggregate(
+                    sensor, archived, start, end, interval, tier):
+                value = {'mean': total / count if count else None, 'max': high, 'min': low,
+                         'sum': total, 'count': count}[function]
+                buckets.setdefault(bucket, [None] * len(columns))[index] = value
+
+        # Rollups of the tier bucket holding the start are read whole, don't
+        # report any falling before the first GROUP BY bucket
+        first = int(start) // interval * interval
+        if fill == 'none':
+            return [[bucket] + values for bucket, values in sorted(buckets.items())
+                    if bucket >= first]
+        rows = []
+        previous = [None] * len(columns)
+        for bucket in range(first, int(math.ceil(end)), interval):
+            values = buckets.get(bucket)
+            if values is None:
+                if fill == 'previous':
+                    values = list(previous)
+                elif fill not in ('null', 'linear'):
+                    values = [parse_number(fill)] * len(columns)
+                else:
+                    values = [None] * len(columns)
+            previous = [value if value is not None else last for value, last in zip(values, previous)]
+            rows.append([bucket] + values)
+        return rows
+
+    def raw(self, measurement, columns, start, end):
+        """Rows of the finest readings kept, for a query without GROUP BY"""
+        start = start if start is not None else 0
+        end = end if end is not None else time.time() + 1
+        tier = self.archive.tier(start)
+        rows = dict()
+        for index, (function, field, alias) in enumerate(columns):
+            if function is not None:
+                raise QueryError('aggregate ' + function + ' needs GROUP BY time()')
+            sensor, archived = self.archived(measurement, field)
+            for reading in self.archive.read(sensor, archived, start, end, tier)[-RAW_LIMIT:]:
+                # Rollups read without GROUP BY give their mean
+                value = reading[1] if tier == 'raw' else reading[2] / reading[1]
+                rows.setdefault(reading[0], [None] * len(columns))[index] = value
+        return [[observed] + values for observed, values in sorted(rows.items())]
+
+
+def series(name, columns, values):
+    return {'series': [{'name': name, 'columns': columns, 'values': values}]}
+
+
+def unquote(name):
+    name = name.strip()
+    if len(name) > 1 and name[0] == name[-1] and name[0] in '"\'':
+        return name[1:-1]
+    return name
+
+
+def measurement_name(text):
+    """Measurement of e.g. "metpod"."autogen"."mpduk1" """
+    return unquote(re.split(r'\.(?=(?:[^"]*"[^"]*")*[^"]*$)', text.strip())[-1])
+
+
+def split_fields(text):
+    """Split the selected fields at commas outside parentheses"""
+    fields, depth, current = [], 0, ''
+    for character in text:
+        depth += {'(': 1, ')': -1}.get(character, 0)
+        if character == ',' and depth == 0:
+            fields.append(current)
+            current = ''
+        else:
+            current += character
+    fields.append(current)
+    return [field.strip() for field in fields if field.strip()]
+
+
+def parse_field(text):
+    """:return: Tuple of (aggregate function or None, field name, alias)"""
+    match = FIELD_PATTERN.match(text)
+    if not match:
+        raise QueryError('unable to parse field: ' + text)
+    alias = unquote(match.group('alias')) if match.group('alias') else None
+    if match.group('function'):
+        function = match.group('function').lower()
+        if function not in AGGREGATES:
+            raise QueryError('unsupported function: ' + function)
+        return function, unquote(match.group('inner')), alias
+    field = unquote(match.group('plain'))
+    if field == '*':
+        raise QueryError('select the fields by name')
+    return None, field, alias
+
+
+def column_names(columns):
+    """Response column names, e.g. mean, mean_1 for two means"""
+    names = []
+    for function, field, alias in columns:
+        name = alias or function or field
+        count = sum(1 for other in names if other == name or other.startswith(name + '_'))
+        names.append(name + '_' + str(count) if count else name)
+    return names
+
+
+def duration(text):
+    """Seconds of an InfluxQL duration e.g. '10m'"""
+    match = re.match(r'^(\d+)([a-zµ]+)$', text.strip())
+    if not match or match.group(2) not in DURATIONS:
+        raise QueryError('invalid duration: ' + text)
+    return int(match.group(1)) * DURATIONS[match.group(2)]
+
+
+def parse_number(text):
+    try:
+        return float(text)
+    except ValueError:
+        raise QueryError('unsupported fill: ' + text)
+
+
+def time_value(text, now):
+    """Epoch seconds of a time in a WHERE clause: now() - 6h, an epoch
+    with a unit e.g. 1620000000000ms (nanoseconds without one) or an
+    RFC3339 string"""
+    text = text.strip()
+    if text.lower().startswith('now()'):
+        offset = text[5:].replace(' ', '')
+        if not offset:
+            return now
+        seconds = duration(offset[1:])
+        return now - seconds if offset[0] == '-' else now + seconds
+    if text.startswith("'"):
+        value = text.strip("'")
+        for layout in ('%Y-%m-%dT%H:%M:%SZ', '%Y-%m-%dT%H:%M:%S.%fZ', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+            try:
+                return calendar.timegm(datetime.strptime(value, layout).timetuple())
+            except ValueError:
+                continue
+        raise QueryError('invalid time: ' + value)
+    match = re.match(r'^(\d+)([a-zµ]*)$', text)
+    if not match or (match.group(2) or 'ns') not in DURATIONS:
+        raise QueryError('invalid time: ' + text)
+    return int(match.group(1)) * DURATIONS[match.group(2) or 'ns']
+
+
+def time_range(where, now):
+    """The (start, end) epoch seconds of the time conditions of a WHERE
+    clause, None where unbounded. Other conditions are ignored, the
+    archive has no tags. The end is exclusive."""
+    start = end = None
+    for match in TIME_PATTERN.finditer(where):
+        op, value = match.group('op'), time_value(match.group('value'), now)
+        if op in ('>', '>='):
+            value = value if op == '>=' else value + 1e-9
+            start = value if start is None else max(start, value)
+        elif op in ('<', '<='):
+            value = value + 1 if op == '<=' else value
+            end = value if end is None else min(end, value)
+        else:
+            start, end = value, value + 1
+    return start, end
+
+
+def format_time(timestamp, epoch):
+    """A time in the response, as a number of epoch units or RFC3339"""
+    if epoch:
+        if epoch not in DURATIONS:
+            raise QueryError('invalid epoch: ' + epoch)
+        return int(round(timestamp / DURATIONS[epoch]))
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(timestamp))
@@ -0,0 +1,76 @@
+import calendar
+import time
+
+# Versioned positional schemas of (field, scale). Values are sent as integers
+# of value * scale. New fields are only ever added in a new version so that
+# messages from stations running older software can still be decoded.
+SCHEMAS = {
+    1: (('pressure', 100), ('trend', 1), ('tendency', 100), ('humidity', 10),
+        ('tempc', 100), ('dewptc', 100), ('rainrate', 100), ('windspeed', 10),
+        ('winddir', 1), ('windgustkts', 10), ('winddir_avg10m', 1),
+        ('windspd_avg10m', 10), ('dailyrainmm', 100), ('day_max', 100),
+        ('night_min', 100), ('qnh', 100), ('qfe', 100)),
+}
+VERSION = 1
+
+# Seconds added to the observation time for the Dynamo DB 'time to live'
+TTL = 86400
+
+
+def encode(data, version=VERSION):
+    """Encode an observation as a compact positional array:
+    [version, metpodID, epoch seconds, field mask, value, value, ...]
+    Bit i of the field mask is set when schema field i is in the message, and
+    its value follows in schema order (null when the sensor had no value).
+    Fields left out of change-only messages just have their bit cleared.
+    :param data: Dictionary of observation values, as published to AWS IoT.
+    :param version: Schema version to encode with.
+    :return: List ready to be serialised with json.dumps().
+    """
+    mask = 0
+    values = []
+    for i, (field, scale) in enumerate(SCHEMAS[version]):
+        if field not in data:
+            continue
+        mask |= 1 << i
+        value = data[field]
+        values.append(None if value is None else int(round(value * scale)))
+    return [version, data.get('metpodID'), to_epoch(data.get('timestamp')), mask] + values
+
+
+def decode(message):
+    """Decode a compact positional array back to an observation dictionary
+    with the same keys as the verbose JSON message.
+    :param message: List as produced by encode().
+    :return: Dictionary of observation values.
+    :raise: ValueError if the message can't be decoded.
+    """
+    try:
+        version, station, epoch, mask = message[:4]
+        schema = SCHEMAS[version]
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('Not a compact message')
+
+    data = {'metpodID': station,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(epoch)),
+            'ttl': epoch + TTL}
+    values = iter(message[4:])
+    for i, (field, scale) in enumerate(schema):
+        if mask & (1 << i):
+            value = next(values, None)
+            data[field] = None if value is None else value / scale
+    return data
+
+
+def is_compact(message):
+    """Check if a decoded JSON message is a single compact array"""
+    return isinstance(message, list) and len(message) >= 4 and isinstance(message[0], int)
+
+
+def to_epoch(timestamp):
+    """Convert an observation timestamp e.g. '2020-06-01T12:00:00Z' to epoch
+    seconds, the current time if it can't be read."""
+    try:
+        return calendar.timegm(time.strptime(timestamp, '%Y-%m-%dT%H:%M:%SZ'))
+    except (TypeError, ValueError):
+        return int(time.time())
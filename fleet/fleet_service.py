@@ -0,0 +1,239 @@
+import os
+import re
+import json
+import time
+import zlib
+import logging
+import multiprocessing
+from queue import Empty
+from threading import Lock, Thread
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import paho.mqtt.client as mqtt
+from fleet_state import StationTable, FIELD_INDEX, AGGREGATE_HOURS, \
+    decode_batch, merge_summaries
+
+logging.basicConfig(level=logging.INFO)
+logging.captureWarnings(True)
+
+# Used to find the station ID of a message without decoding all of it
+STATION_PATTERN = re.compile(rb'"metpodID":\s*"([^"]*)"|^\s*\[[\s\[]*\d+\s*,\s*"([^"]*)"')
+
+
+class ShardUnavailable(Exception):
+    pass
+
+
+def shard_worker(inbox, outbox):
+    """Worker process holding the state of one shard of the fleet. Decodes
+    and applies batches of raw station messages, and answers queries.
+    :param inbox: Queue of ('batch', payloads, received) and
+    ('query', query ID, name, args) requests.
+    :param outbox: Queue the (query ID, ok, result) replies are returned on.
+    """
+    table = StationTable()
+    while True:
+        request = inbox.get()
+        if request[0] == 'batch':
+            try:
+                table.update(decode_batch(request[1], request[2]))
+            except Exception:
+                logging.exception('Fleet worker failed to apply a batch')
+        elif request[0] == 'query':
+            query_id, name, args = request[1], request[2], request[3]
+            try:
+                outbox.put((query_id, True, getattr(table, name)(*args)))
+            except Exception as e:
+                logging.exception('Fleet worker failed on query ' + name)
+                outbox.put((query_id, False, str(e)))
+
+
+class FLEETservice:
+    def __init__(self):
+        """Fleet ingestion service. Subscribes to the topic the metpod
+        stations publish their observations on and spreads the stations over
+        a number of worker processes by station ID. Raw messages are passed
+        to the workers in batches, and fleet-wide queries are answered by
+        asking every worker and merging the results."""
+        self.topic = os.getenv('FLEET_TOPIC', 'mpduk_dev')
+        self.workers = int(os.getenv('FLEET_WORKERS', multiprocessing.cpu_count()))
+        self.batch_size = int(os.getenv('FLEET_BATCH_SIZE', 500))
+        self.batch_interval = float(os.getenv('FLEET_BATCH_INTERVAL', 0.5))
+        # Longest time (seconds) to wait for a worker to answer a query
+        self.query_timeout = float(os.getenv('FLEET_QUERY_TIMEOUT', 10))
+
+        self.batch_lock = Lock()
+        self.query_lock = Lock()
+        self.batches = [[] for _ in range(self.workers)]
+        self.query_id = 0
+        self.processes = []
+        self.inboxes = []
+        self.outboxes = []
+        for _ in range(self.workers):
+            inbox = multiprocessing.Queue()
+            outbox = multiprocessing.Queue()
+            process = multiprocessing.Process(target=shard_worker, args=(inbox, outbox),
+                                              daemon=True)
+            process.start()
+            self.processes.append(process)
+            self.inboxes.append(inbox)
+            self.outboxes.append(outbox)
+        logging.info('Fleet workers: ' + str(self.workers))
+
+        Thread(target=self.batch_flusher, daemon=True).start()
+
+        mqtt_host = os.getenv('MQTT_HOST', 'localhost')
+        mqtt_port = int(os.getenv('MQTT_PORT', 1883))
+        self.client = mqtt.Client(os.getenv('FLEET_CLIENT_ID', 'metpod-fleet'))
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+        self.client.reconnect_delay_set(1, 60)
+        self.client.connect_async(mqtt_host, mqtt_port, keepalive=60)
+        self.client.loop_start()
+        logging.info('Fleet subscribing to ' + self.topic + ' on ' +
+                     mqtt_host + ':' + str(mqtt_port))
+
+    def on_connect(self, client, userdata, flags, rc):
+        client.subscribe(self.topic, 1)
+
+    def on_message(self, client, userdata, message):
+        """Add a received message to the batch of the shard that holds its
+        station, sending the batch on once it is full."""
+        shard = self.shard(message.payload)
+        with self.batch_lock:
+            batch = self.batches[shard]
+            batch.append(message.payload)
+            if len(batch) >= self.batch_size:
+                self.flush(shard)
+
+    def shard(self, payload):
+        """The worker a station's messages are sent to. This must always
+        be the same for a given station."""
+        match = STATION_PATTERN.search(payload)
+        if match is None:
+            return 0
+        return zlib.crc32(match.group(1) or match.group(2)) % self.workers
+
+    def flush(self, shard):
+        """Send a shard's batch of messages on to its worker. The batch
+        lock must be held."""
+        if self.batches[shard]:
+            self.inboxes[shard].put(('batch', self.batches[shard], time.time()))
+            self.batches[shard] = []
+
+    def batch_flusher(self):
+        """Send partly filled batches on at the batch interval so messages
+        are never held for long on a quiet broker."""
+        while True:
+            time.sleep(self.batch_interval)
+            with self.batch_lock:
+                for shard in range(self.workers):
+                    self.flush(shard)
+
+    def query(self, name, *args):
+        """Run a StationTable query on every worker.
+        :return: List of the results from each worker.
+        :raises ShardUnavailable: If a worker has died, fails the query or
+        doesn't answer within the query timeout.
+        """
+        with self.query_lock:
+            for shard, process in enumerate(self.processes):
+                if not process.is_alive():
+                    raise ShardUnavailable('fleet worker ' + str(shard) + ' has stopped')
+            self.query_id += 1
+            for inbox in self.inboxes:
+                inbox.put(('query', self.query_id, name, args))
+            deadline = time.time() + self.query_timeout
+            return [self.reply(shard, deadline) for shard in range(self.workers)]
+
+    def reply(self, shard, deadline):
+        """Wait for a worker's reply to the current query, discarding any
+        late replies to earlier queries that timed out."""
+        while True:
+            try:
+                query_id, ok, result = self.outboxes[shard].get(
+                    timeout=max(deadline - time.time(), 0))
+            except Empty:
+                raise ShardUnavailable('fleet worker ' + str(shard) + ' did not answer')
+            if query_id != self.query_id:
+                continue
+            if not ok:
+                raise ShardUnavailable('fleet worker ' + str(shard) + ' failed: ' + result)
+            return result
+
+    def get_stations(self):
+        stations = [station for result in self.query('list') for station in result]
+        return [{'metpodID': station, 'last_seen': last_seen}
+                for station, last_seen in sorted(stations)]
+
+    def get_station(self, station, hours):
+        for result in self.query('station', station, hours):
+            if result is not None:
+                return result
+        return None
+
+    def get_summary(self, field, max_age):
+        return merge_summaries(self.query('summary', field, max_age))
+
+    def get_stale(self, max_age):
+        stale = [station for result in self.query('stale', max_age) for station in result]
+        return [{'metpodID': station, 'last_seen': last_seen}
+                for station, last_seen in sorted(stale)]
+
+
+class FLEEThttp(BaseHTTPRequestHandler):
+    """Fleet queries:
+    /stations - all known stations and when they were last heard from
+    /stations/<metpodID>?hours=24 - latest state and rolling aggregates
+    /summary?field=tempc&max_age=3600 - fleet-wide mean/min/max of a field
+    /stale?max_age=3600 - stations not heard from recently
+    """
+    def _set_headers(self, status=200):
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        path = url.path.rstrip('/').split('/')[1:]
+        try:
+            max_age = float(query.get('max_age', ['3600'])[0])
+            hours = min(int(query.get('hours', [AGGREGATE_HOURS])[0]), AGGREGATE_HOURS)
+        except ValueError:
+            self._set_headers(400)
+            return
+
+        try:
+            if path == ['stations']:
+                result = FLEETservice.get_stations()
+            elif len(path) == 2 and path[0] == 'stations':
+                result = FLEETservice.get_station(path[1], hours)
+            elif path == ['summary'] and query.get('field', [None])[0] in FIELD_INDEX:
+                result = FLEETservice.get_summary(query['field'][0], max_age)
+            elif path == ['stale']:
+                result = FLEETservice.get_stale(max_age)
+            else:
+                result = None
+        except ShardUnavailable as e:
+            logging.warning(str(e))
+            self._set_headers(503)
+            self.wfile.write(json.dumps({'error': str(e)}).encode('UTF-8'))
+            return
+
+        if result is None:
+            self._set_headers(404)
+            return
+        self._set_headers()
+        self.wfile.write(json.dumps(result).encode('UTF-8'))
+
+
+""" Start the ingestion workers and the server that answers fleet queries """
+if __name__ == '__main__':
+    FLEETservice = FLEETservice()
+
+    while True:
+        server_address = ('', int(os.getenv('FLEET_HTTP_PORT', 8080)))
+        httpd = ThreadingHTTPServer(server_address, FLEEThttp)
+        logging.info('FLEET query server running')
+        httpd.serve_forever()
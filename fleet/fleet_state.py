@@ -0,0 +1,265 @@
+import json
+import math
+import time
+import calendar
+from array import array
+import compact_codec
+
+# Observation fields held for every station, in storage order
+FIELDS = ('pressure', 'qnh', 'qfe', 'tendency', 'trend', 'tempc', 'dewptc',
+          'humidity', 'rainrate', 'dailyrainmm', 'windspeed', 'winddir',
+          'windgustkts', 'winddir_avg10m', 'windspd_avg10m', 'day_max',
+          'night_min')
+FIELD_INDEX = {field: i for i, field in enumerate(FIELDS)}
+
+# Rolling aggregates are kept in hourly buckets covering this many hours
+AGGREGATE_HOURS = 24
+
+NAN = float('nan')
+
+
+def decode_batch(payloads, received=None):
+    """Decode a batch of station messages as published by the metpod
+    MQTTclient.
+    :param payloads: List of raw JSON message payloads.
+    :param received: Time the batch was received, used for messages
+    without a timestamp.
+    :return: List of (station ID, epoch seconds, values) tuples where values
+    are in FIELDS order, with NaN for null values and None for fields left
+    out of the message. Messages that cannot be decoded or have no station
+    ID are skipped.
+    """
+    if received is None:
+        received = time.time()
+
+    records = []
+    for payload in payloads:
+        try:
+            messages = json.loads(payload)
+        except ValueError:
+            continue
+        # Stations in batching mode publish an array of observations
+        if not isinstance(messages, list) or compact_codec.is_compact(messages):
+            messages = [messages]
+        for message in messages:
+            try:
+                if compact_codec.is_compact(message):
+                    message = compact_codec.decode(message)
+                station = message['metpodID']
+            except (KeyError, TypeError, ValueError):
+                continue
+            if station is None or station == '':
+                # Every station needs an ID to be stored and listed under
+                continue
+            station = str(station)
+            values = tuple(to_float(message[field]) if field in message else None
+                           for field in FIELDS)
+            records.append((station, parse_timestamp(message.get('timestamp'), received), values))
+    return records
+
+
+def to_float(value):
+    """Convert a message value to float, NaN if missing or invalid."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return NAN
+
+
+def parse_timestamp(timestamp, default):
+    """Convert an ISO timestamp e.g. '2020-06-01T12:00:00Z' to epoch
+    seconds, returning the default if it cannot be read."""
+    try:
+        return calendar.timegm((int(timestamp[0:4]), int(timestamp[5:7]),
+                                int(timestamp[8:10]), int(timestamp[11:13]),
+                                int(timestamp[14:16]), int(timestamp[17:19])))
+    except (TypeError, ValueError):
+        return default
+
+
+class StationTable:
+    def __init__(self):
+        """Latest state and rolling hourly aggregates for a shard of the
+        fleet. Every station is given a row number and all values are held
+        in flat typed arrays indexed by row, so each station costs a fixed
+        13 KB or so (mostly the 4 x 24 x 17 aggregate cells of 8 bytes)
+        regardless of how many messages it sends:
+        latest[row * F + f] - latest value of field f
+        bucket_hour[row * H + h] - the hour held in aggregate bucket h
+        count/total/low/high[(row * H + h) * F + f] - bucket aggregates
+        """
+        self.rows = dict()
+        self.stations = []
+        self.last_seen = array('d')
+        self.latest = array('d')
+        self.bucket_hour = array('l')
+        self.count = array('l')
+        self.total = array('d')
+        self.low = array('d')
+        self.high = array('d')
+
+    def row(self, station):
+        """Get the row number of a station, adding it if it is new."""
+        row = self.rows.get(station)
+        if row is None:
+            row = len(self.stations)
+            self.rows[station] = row
+            self.stations.append(station)
+            self.last_seen.append(0.0)
+            self.latest.extend([NAN] * len(FIELDS))
+            self.bucket_hour.extend([-1] * AGGREGATE_HOURS)
+            cells = AGGREGATE_HOURS * len(FIELDS)
+            self.count.extend([0] * cells)
+            self.total.extend([0.0] * cells)
+            self.low.extend([NAN] * cells)
+            self.high.extend([NAN] * cells)
+        return row
+
+    def update(self, records):
+        """Apply a batch of decoded records to the table.
+        :param records: List of (station ID, epoch seconds, values) tuples.
+        """
+        n_fields = len(FIELDS)
+        for station, timestamp, values in records:
+            row = self.row(station)
+            if timestamp >= self.last_seen[row]:
+                self.last_seen[row] = timestamp
+                # Fields left out of change-only messages keep their last value
+                base = row * n_fields
+                for f, value in enumerate(values):
+                    if value is not None:
+                        self.latest[base + f] = value
+
+            hour = int(timestamp // 3600)
+            bucket = row * AGGREGATE_HOURS + hour % AGGREGATE_HOURS
+            if self.bucket_hour[bucket] != hour:
+                if self.bucket_hour[bucket] > hour:
+                    # Too old to fit in the rolling window
+                    continue
+                self.reset_bucket(bucket, hour)
+
+            base = bucket * n_fields
+            for f, value in enumerate(values):
+                if value is None or value != value:
+                    continue
+                cell = base + f
+                if self.count[cell] == 0:
+                    self.low[cell] = value
+                    self.high[cell] = value
+                else:
+                    if value < self.low[cell]:
+                        self.low[cell] = value
+                    if value > self.high[cell]:
+                        self.high[cell] = value
+                self.count[cell] += 1
+                self.total[cell] += value
+
+    def reset_bucket(self, bucket, hour):
+        """Clear an aggregate bucket for reuse for a new hour."""
+        n_fields = len(FIELDS)
+        base = bucket * n_fields
+        self.bucket_hour[bucket] = hour
+        self.count[base:base + n_fields] = array('l', [0] * n_fields)
+        self.total[base:base + n_fields] = array('d', [0.0] * n_fields)
+        self.low[base:base + n_fields] = array('d', [NAN] * n_fields)
+        self.high[base:base + n_fields] = array('d', [NAN] * n_fields)
+
+    def station(self, station, hours=AGGREGATE_HOURS, now=None):
+        """Latest state and rolling aggregates of one station.
+        :param station: The station metpodID.
+        :param hours: Length of the rolling aggregate window in hours.
+        :param now: Current epoch time.
+        :return: Dictionary of station state, or None if not known here.
+        """
+        row = self.rows.get(station)
+        if row is None:
+            return None
+
+        n_fields = len(FIELDS)
+        latest = self.latest[row * n_fields:(row + 1) * n_fields]
+        aggregates = dict()
+        for field, f in FIELD_INDEX.items():
+            count, total, low, high = self.aggregate(row, f, hours, now)
+            if count:
+                aggregates[field] = {'count': count, 'mean': total / count,
+                                     'min': low, 'max': high}
+        return {'metpodID': station,
+                'last_seen': self.last_seen[row],
+                'latest': {field: value for field, value in zip(FIELDS, latest)
+                           if not math.isnan(value)},
+                'aggregates': aggregates}
+
+    def aggregate(self, row, f, hours, now=None):
+        """Combine the hourly buckets of one station field over the last
+        number of hours.
+        :return: Tuple of (count, total, min, max)."""
+        if now is None:
+            now = time.time()
+        first_hour = int(now // 3600) - hours + 1
+        n_fields = len(FIELDS)
+        count, total, low, high = 0, 0.0, NAN, NAN
+        for h in range(AGGREGATE_HOURS):
+            bucket = row * AGGREGATE_HOURS + h
+            if self.bucket_hour[bucket] < first_hour:
+                continue
+            cell = bucket * n_fields + f
+            if self.count[cell] == 0:
+                continue
+            if count == 0 or self.low[cell] < low:
+                low = self.low[cell]
+            if count == 0 or self.high[cell] > high:
+                high = self.high[cell]
+            count += self.count[cell]
+            total += self.total[cell]
+        return count, total, low, high
+
+    def summary(self, field, max_age, now=None):
+        """Partial fleet-wide summary of the latest values of a field over
+        the stations in this table heard from within max_age seconds. The
+        results from each shard are combined with merge_summaries().
+        :return: Dictionary of count, total, min and max (with station)."""
+        if now is None:
+            now = time.time()
+        f = FIELD_INDEX[field]
+        n_fields = len(FIELDS)
+        result = {'count': 0, 'total': 0.0, 'min': None, 'max': None}
+        for row, station in enumerate(self.stations):
+            if now - self.last_seen[row] > max_age:
+                continue
+            value = self.latest[row * n_fields + f]
+            if math.isnan(value):
+                continue
+            result['count'] += 1
+            result['total'] += value
+            if result['min'] is None or value < result['min'][0]:
+                result['min'] = (value, station)
+            if result['max'] is None or value > result['max'][0]:
+                result['max'] = (value, station)
+        return result
+
+    def stale(self, max_age, now=None):
+        """Stations in this table not heard from within max_age seconds.
+        :return: List of (station ID, last seen) tuples."""
+        if now is None:
+            now = time.time()
+        return [(station, self.last_seen[row]) for row, station in enumerate(self.stations)
+                if now - self.last_seen[row] > max_age]
+
+    def list(self):
+        """All stations in this table with their last seen time."""
+        return [(station, self.last_seen[row]) for row, station in enumerate(self.stations)]
+
+
+def merge_summaries(summaries):
+    """Combine the partial field summaries returned by each shard into a
+    fleet-wide summary."""
+    count = sum(s['count'] for s in summaries)
+    total = sum(s['total'] for s in summaries)
+    lows = [s['min'] for s in summaries if s['min'] is not None]
+    highs = [s['max'] for s in summaries if s['max'] is not None]
+    low = min(lows) if lows else None
+    high = max(highs) if highs else None
+    return {'stations': count,
+            'mean': total / count if count else None,
+            'min': {'value': low[0], 'metpodID': low[1]} if low else None,
+            'max': {'value': high[0], 'metpodID': high[1]} if high else None}
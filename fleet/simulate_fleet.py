@@ -0,0 +1,84 @@
+import json
+import time
+import random
+import argparse
+from datetime import datetime
+import paho.mqtt.client as mqtt
+
+
+def station_message(station_id, state):
+    """Build an observation message in the same format as the metpod
+    AWS IoT publisher, random-walking the station's previous values.
+    :param station_id: The simulated station metpodID.
+    :param state: Dictionary of the station's current values, updated.
+    :return: JSON formatted message.
+    """
+    state['pressure'] = round(min(max(state['pressure'] + random.uniform(-0.3, 0.3), 950), 1050), 1)
+    state['tempc'] = round(state['tempc'] + random.uniform(-0.2, 0.2), 1)
+    state['humidity'] = int(min(max(state['humidity'] + random.randint(-2, 2), 20), 100))
+    state['windspeed'] = max(0, state['windspeed'] + random.randint(-2, 2))
+    state['winddir'] = (state['winddir'] + random.randint(-10, 10)) % 360
+
+    data = dict()
+    data['pressure'] = state['pressure']
+    data['trend'] = None
+    data['tendency'] = None
+    data['humidity'] = state['humidity']
+    data['tempc'] = state['tempc']
+    data['dewptc'] = round(state['tempc'] - (100 - state['humidity']) / 5.0, 1)
+    data['rainrate'] = 0.0
+    data['windspeed'] = state['windspeed']
+    data['winddir'] = state['winddir']
+    data['windgustkts'] = state['windspeed'] + random.randint(0, 8)
+    data['winddir_avg10m'] = state['winddir']
+    data['windspd_avg10m'] = state['windspeed']
+    data['dailyrainmm'] = 0.0
+    data['day_max'] = None
+    data['night_min'] = None
+    data['timestamp'] = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+    data['qnh'] = round(state['pressure'] + 1.5, 2)
+    data['qfe'] = round(state['pressure'] + 0.4, 2)
+    data['metpodID'] = station_id
+    data['ttl'] = int(time.time()) + 86400
+    return json.dumps(data)
+
+
+def simulate(host, port, topic, stations, interval):
+    """Publish observations from a simulated fleet of stations, each
+    station sending one message per interval, spread evenly over it."""
+    client = mqtt.Client('metpod-fleet-simulator')
+    client.max_inflight_messages_set(1000)
+    client.connect(host, port)
+    client.loop_start()
+
+    fleet = {'sim%05d' % i: {'pressure': random.uniform(990, 1030),
+                             'tempc': random.uniform(0, 25),
+                             'humidity': random.randint(40, 95),
+                             'windspeed': random.randint(0, 20),
+                             'winddir': random.randint(0, 359)}
+             for i in range(stations)}
+    pause = interval / stations
+
+    sent = 0
+    started = time.time()
+    while True:
+        for station_id, state in fleet.items():
+            client.publish(topic, station_message(station_id, state), qos=1)
+            sent += 1
+            time.sleep(pause)
+        print('Sent %d messages, %.1f msg/s' % (sent, sent / (time.time() - started)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Publish a simulated fleet of metpod '
+                                                 'stations to an MQTT broker, e.g. a '
+                                                 'local Mosquitto, for testing the '
+                                                 'fleet ingestion service.')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=1883)
+    parser.add_argument('--topic', default='mpduk_dev')
+    parser.add_argument('--stations', type=int, default=1000)
+    parser.add_argument('--interval', type=float, default=60.0,
+                        help='Seconds between messages from each station')
+    args = parser.parse_args()
+    simulate(args.host, args.port, args.topic, args.stations, args.interval)
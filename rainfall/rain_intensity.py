@@ -0,0 +1,105 @@
+import os
+import time
+from collections import deque
+from threading import Lock
+
+# No rain rate once it has been this long since the last tip
+RATE_TIMEOUT = 3600
+
+
+class RainIntensity:
+    def __init__(self):
+        """Rain accumulations and intensity worked out from the times of the
+        gauge tips rather than the gauge's own rain rate. Each of the
+        RAIN_WINDOWS (comma separated minutes, default 1, 10 and 60 minutes
+        and 24 hours) keeps a deque of the (time, mm) tips inside it and a
+        running sum, so tips are added and expired in O(1) and nothing is
+        rescanned when the readings are requested.
+        The rain rate is the rate of the last two tips, or lower once the
+        time since the last tip is longer than the gap between them. The
+        peak rate is the highest since the daily total was last reset.
+        """
+        windows = os.getenv('RAIN_WINDOWS', '1,10,60,1440')
+        self.windows = [int(minutes) * 60 for minutes in windows.split(',') if minutes.strip()]
+        self.lock = Lock()
+        self.tips = [deque() for seconds in self.windows]
+        self.sums = [0.0] * len(self.windows)
+        self.last_tip = None
+        self.last_interval = None
+        self.last_amount = None
+        self.peak_rate = None
+        self.peak_time = None
+
+    def tip(self, amount, now=None, peak=True):
+        """Add a tip.
+        :param amount: Rain (mm) of the tip.
+        :param now: Time of the tip (epoch seconds), defaults to now.
+        :param peak: False if the tip is from before the peak rate was last
+        reset, so it can't set the peak rate.
+        """
+        now = now or time.time()
+        with self.lock:
+            for index, tips in enumerate(self.tips):
+                tips.append((now, amount))
+                self.sums[index] += amount
+            self.expire(now)
+
+            if self.last_tip is not None and now <= self.last_tip:
+                # A tip received late, the rate stays that of the latest tips
+                return
+            if self.last_tip is not None:
+                self.last_interval = now - self.last_tip
+                rate = amount * 3600 / self.last_interval
+                if peak and (self.peak_rate is None or rate > self.peak_rate):
+                    self.peak_rate = rate
+                    self.peak_time = now
+            self.last_tip = now
+            self.last_amount = amount
+
+    def expire(self, now):
+        for index, seconds in enumerate(self.windows):
+            tips = self.tips[index]
+            while tips and tips[0][0] <= now - seconds:
+                self.sums[index] -= tips.popleft()[1]
+            if not tips:
+                # Start again from an exact sum
+                self.sums[index] = 0.0
+
+    def reset(self):
+        """Start a new peak rate, e.g. at the daily total reset"""
+        with self.lock:
+            self.peak_rate = None
+            self.peak_time = None
+
+    def rate(self, now):
+        """The current rain rate (mm/h)"""
+        if self.last_tip is None or now - self.last_tip > RATE_TIMEOUT:
+            return 0.0
+        since = now - self.last_tip
+        if self.last_interval is None or since > self.last_interval:
+            # Not raining as hard as the last two tips, it has been at most
+            # one tip's worth since the last
+            return self.last_amount * 3600 / max(since, 1)
+        return self.last_amount * 3600 / self.last_interval
+
+    def fields(self, now=None):
+        """Dictionary of the accumulations (mm) of each window, e.g.
+        rain_10m_mm or rain_24h_mm, the rain rate and the peak rate (mm/h)"""
+        now = now or time.time()
+        with self.lock:
+            self.expire(now)
+            fields = {'rain_' + label(seconds) + '_mm': round(total, 1)
+                      for seconds, total in zip(self.windows, self.sums)}
+            fields['rain_rate_mmh'] = round(self.rate(now), 1)
+            fields['peak_rate_mmh'] = None if self.peak_rate is None else round(self.peak_rate, 1)
+            fields['peak_rate_time'] = None if self.peak_time is None else \
+                time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.peak_time))
+        return fields
+
+
+def label(seconds):
+    """Window label, e.g. 10m or 24h"""
+    minutes = seconds // 60
+    if minutes >= 60 and minutes % 60 == 0:
+        return str(minutes // 60) + 'h'
+    return str(minutes) + 'm'
@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import logging
+import warnings
+from collections import OrderedDict
+from threading import RLock
+
+
+class RainJournal:
+    def __init__(self, totals):
+        """Crash safe record of the rain totals. Every tip and reset is
+        appended to the journal RAIN_JOURNAL_FILE, synced to disk at most
+        every RAIN_JOURNAL_SYNC seconds, and every RAIN_SNAPSHOT_INTERVAL
+        seconds the totals are written to a snapshot and the journal is
+        emptied. On start up the snapshot is read and only the entries
+        journalled since are replayed, so recovery stays quick however long
+        the station has been running.
+        Entries are numbered, the snapshot records the last one it includes,
+        so a crash between writing the snapshot and emptying the journal
+        doesn't count entries twice. The IDs of the latest tips are kept so
+        that the same tip posted again (e.g. a retry of a post that did get
+        through) is only counted once.
+        :param totals: The RainTotals kept by the journal.
+        """
+        self.path = os.getenv('RAIN_JOURNAL_FILE', '/data/rain_journal.log')
+        self.snapshot_path = os.getenv('RAIN_SNAPSHOT_FILE', '/data/rain_snapshot.json')
+        self.sync_interval = float(os.getenv('RAIN_JOURNAL_SYNC', 1.0))
+        # Number of recent tip IDs remembered for spotting duplicates
+        self.keep_ids = 1000
+
+        # Re-entrant so the rainfall service can hold it while it updates
+        # the rain intensity along with the totals
+        self.lock = RLock()
+        self.totals = totals
+        self.sequence = 0
+        # Last entry included in the snapshot
+        self.snapshot_sequence = 0
+        self.tip_ids = OrderedDict()
+        self.file = None
+        self.synced = 0
+        self.recover()
+
+    def recover(self):
+        """Restore the totals from the snapshot and the journal"""
+        started = time.time()
+        try:
+            with open(self.snapshot_path) as snapshot_file:
+                snapshot = json.load(snapshot_file)
+            self.totals.restore(snapshot['totals'])
+            self.snapshot_sequence = self.sequence = snapshot['sequence']
+            self.tip_ids = OrderedDict.fromkeys(snapshot['tip_ids'])
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            warnings.warn('Unable to read rain snapshot ' + self.snapshot_path + ': ' + str(e), Warning)
+
+        replayed = 0
+        try:
+            with open(self.path, 'rb+') as journal_file:
+                data = journal_file.read()
+                # Cut off a part written last line from a crash, so new
+                # entries start on a line of their own
+                end = data.rfind(b'\n') + 1
+                if end < len(data):
+                    journal_file.truncate(end)
+                for line in data[:end].splitlines():
+                    try:
+                        entry = json.loads(line.decode('UTF-8'))
+                    except ValueError:
+                        continue
+                    if entry['seq'] > self.snapshot_sequence:
+                        self.apply(entry)
+                        replayed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            warnings.warn('Unable to read rain journal ' + self.path + ': ' + str(e), Warning)
+
+        logging.info('Rain totals recovered in %.3f s, %d journal entries replayed'
+                     % (time.time() - started, replayed))
+
+    def apply(self, entry):
+        self.sequence = max(self.sequence, entry['seq'])
+        if 'reset' in entry:
+            self.totals.reset(entry['time'])
+        else:
+            self.totals.add(entry['amount'], entry.get('tip_time') or entry['time'])
+            if entry.get('tip_id') is not None:
+                self.remember(entry['tip_id'])
+
+    def remember(self, tip_id):
+        self.tip_ids[tip_id] = None
+        while len(self.tip_ids) > self.keep_ids:
+            self.tip_ids.popitem(last=False)
+
+    def append(self, entry):
+        """Number an entry, write it to the journal and apply it"""
+        self.sequence += 1
+        entry['seq'] = self.sequence
+        entry['time'] = time.time()
+        try:
+            if self.file is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self.file = open(self.path, 'a')
+            self.file.write(json.dumps(entry) + '\n')
+            self.file.flush()
+            if entry['time'] - self.synced >= self.sync_interval:
+                os.fsync(self.file.fileno())
+                self.synced = entry['time']
+        except OSError as e:
+            warnings.warn('Unable to write rain journal ' + self.path + ': ' + str(e), Warning)
+        self.apply(entry)
+
+    def tip(self, amount, tip_id=None, tip_time=None):
+        """Record a tip of the rain gauge.
+        :param amount: Rain (mm).
+        :param tip_id: Unique ID of the tip, or None if it has none.
+        :param tip_time: Time of the tip (epoch seconds), defaults to now.
+        :return: False if the tip was already recorded.
+        """
+        with self.lock:
+            if tip_id is not None and tip_id in self.tip_ids:
+                return False
+            self.append({'tip_id': tip_id, 'amount': amount, 'tip_time': tip_time})
+            return True
+
+    def reset(self):
+        """Record a reset of the since reset total"""
+        with self.lock:
+            self.append({'reset': True})
+
+    def fields(self, now=None):
+        """Dictionary of the rain totals as they stand now"""
+        with self.lock:
+            return self.totals.fields(now)
+
+    def sync(self):
+        """Sync journal entries not yet on disk"""
+        with self.lock:
+            if self.file is not None:
+                try:
+                    os.fsync(self.file.fileno())
+                    self.synced = time.time()
+                except OSError as e:
+                    warnings.warn('Unable to sync rain journal ' + self.path + ': ' + str(e), Warning)
+
+    def snapshot(self):
+        """Write the totals to the snapshot, replacing the previous one
+        atomically, then empty the journal"""
+        with self.lock:
+            if self.sequence == self.snapshot_sequence:
+                return
+            data = json.dumps({'totals': self.totals.state(), 'sequence': self.sequence,
+                               'tip_ids': list(self.tip_ids)})
+            try:
+                os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+                temp_path = self.snapshot_path + '.tmp'
+                with open(temp_path, 'w') as snapshot_file:
+                    snapshot_file.write(data)
+                    snapshot_file.flush()
+                    os.fsync(snapshot_file.fileno())
+                os.replace(temp_path, self.snapshot_path)
+            except OSError as e:
+                warnings.warn('Unable to save rain snapshot ' + self.snapshot_path + ': ' + str(e),
+                              Warning)
+                return
+            self.snapshot_sequence = self.sequence
+            # Entries up to here are in the snapshot, start the journal again
+            try:
+                if self.file is not None:
+                    self.file.close()
+                    self.file = None
+                open(self.path, 'w').close()
+            except OSError as e:
+                warnings.warn('Unable to compact rain journal ' + self.path + ': ' + str(e), Warning)
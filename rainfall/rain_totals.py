@@ -0,0 +1,88 @@
+import os
+import time
+import pytz
+from datetime import datetime, timedelta
+
+PERIODS = ('hour', 'day', 'month', 'year')
+
+
+class RainTotals:
+    def __init__(self):
+        """Rain accumulations over the current hour, rain day, month and
+        year, and since the total was last reset. The periods are local
+        time in RAIN_TIMEZONE with the rain day starting at
+        RAIN_DAY_START_HOUR, e.g. 09-09, and the month and year being those
+        of the rain day. Each period keeps one running total stamped with
+        the period it is for, worked out from the time of the tip, so a
+        period rolls over with the first tip after it ends and a period
+        that has ended with no rain since reads as zero. Nothing depends on
+        a scheduled reset, which would be missed while the service is down,
+        and adding a tip or reading the totals takes constant time.
+        """
+        self.timezone = pytz.timezone(os.getenv('RAIN_TIMEZONE', 'UTC'))
+        self.day_start = int(os.getenv('RAIN_DAY_START_HOUR', 9))
+        # {period: [period key, total mm]}
+        self.periods = {period: [None, 0.0] for period in PERIODS}
+        self.since_reset = 0.0
+        self.reset_time = None
+
+    def keys(self, timestamp):
+        """The period keys of a time, e.g. for 2021-03-31T08:30 local time
+        and a 09 rain day start: day '2021-03-30', month '2021-03', year
+        '2021' and the hour number, which keeps the two 01:00 hours apart
+        when the clocks go back.
+        :param timestamp: Epoch seconds.
+        """
+        local = datetime.fromtimestamp(timestamp, self.timezone)
+        offset = local.utcoffset().total_seconds()
+        day = (local - timedelta(hours=self.day_start)).date()
+        return {'hour': int((timestamp + offset % 3600) // 3600),
+                'day': day.isoformat(),
+                'month': day.strftime('%Y-%m'),
+                'year': str(day.year)}
+
+    def add(self, amount, timestamp):
+        """Add a tip to the totals of its periods.
+        :param amount: Rain (mm).
+        :param timestamp: Time of the tip (epoch seconds).
+        """
+        for period, key in self.keys(timestamp).items():
+            total = self.periods[period]
+            if total[0] is None or key > total[0]:
+                total[:] = [key, 0.0]
+            if key == total[0]:
+                # A late tip of an earlier period has nowhere to go
+                total[1] += amount
+        self.since_reset += amount
+
+    def reset(self, timestamp):
+        """Start the since reset total again"""
+        self.since_reset = 0.0
+        self.reset_time = timestamp
+
+    def total(self, period, keys):
+        key, total = self.periods[period]
+        return total if key == keys[period] else 0.0
+
+    def fields(self, now=None):
+        """Dictionary of the totals (mm) as they stand now"""
+        keys = self.keys(now or time.time())
+        return {'rain_hour_mm': round(self.total('hour', keys), 1),
+                'daily_total_mm': round(self.total('day', keys), 1),
+                'rain_month_mm': round(self.total('month', keys), 1),
+                'rain_year_mm': round(self.total('year', keys), 1),
+                'rain_since_reset_mm': round(self.since_reset, 1),
+                'rain_day': keys['day'],
+                'reset_time': None if self.reset_time is None else
+                time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.reset_time))}
+
+    def state(self):
+        return {'periods': self.periods, 'since_reset': self.since_reset,
+                'reset_time': self.reset_time}
+
+    def restore(self, state):
+        for period in PERIODS:
+            if period in state.get('periods', {}):
+                self.periods[period] = list(state['periods'][period])
+        self.since_reset = state.get('since_reset', 0.0)
+        self.reset_time = state.get('reset_time')
@@ -1,6 +1,11 @@
+import os
+import time
 import logging
-from apscheduler.triggers.cron import CronTrigger
 from apscheduler.schedulers.background import BackgroundScheduler
+from mqtt_publisher import MQTTpublisher
+from rain_journal import RainJournal
+from rain_totals import RainTotals
+from rain_intensity import RainIntensity
 
 
 class RAINFALL:
@@ -8,30 +13,91 @@ class RAINFALL:
         logging.basicConfig(level=logging.INFO)
         logging.captureWarnings(True)
 
-        self.daily_total = 0.0
+        # The totals are kept in the journal so they survive restarts
+        self.journal = RainJournal(RainTotals())
+        self.intensity = RainIntensity()
+        # Rain day of the intensity's peak rate
+        self.peak_day = None
+        self.mqtt_publisher = MQTTpublisher('rainfall')
         self.scheduler = BackgroundScheduler()
 
-        # Setup scheduled reset of daily rain amount, uses the system time
-        self.scheduler.add_job(self.reset_total, CronTrigger(hour=9, minute=0))
+        # The totals roll over by themselves as the hour, day etc. change,
+        # publish them regularly so the retained readings follow
+        self.scheduler.add_job(self.publish, 'interval',
+                               seconds=int(os.getenv('RAIN_PUBLISH_INTERVAL', 60)))
+        self.scheduler.add_job(self.journal.sync, 'interval',
+                               seconds=self.journal.sync_interval)
+        self.scheduler.add_job(self.journal.snapshot, 'interval',
+                               seconds=int(os.getenv('RAIN_SNAPSHOT_INTERVAL', 300)))
         self.scheduler.start()
 
+    def publish(self):
+        self.mqtt_publisher.publish(self.get_total())
+
     def reset_total(self):
-        logging.log('Resetting daily rain total to zero')
-        self.daily_total = 0.0
+        logging.info('Resetting since reset rain total to zero')
+        self.journal.reset()
+        self.publish()
+
+    def data_update(self, tip_amount, tip_id=None, tip_time=None):
+        """Add a rain gauge tip to the totals.
+        :param tip_amount: Rain (mm) of the tip.
+        :param tip_id: Unique ID of the tip, a tip already counted is ignored.
+        :param tip_time: Time of the tip (epoch seconds), defaults to now.
+        """
+        self.record_tip(tip_amount, tip_id, tip_time)
+        self.publish()
+
+    def batch_update(self, tips):
+        """Add a batch of rain gauge tips, publishing the new totals once.
+        :param tips: List of {'tip_id', 'raintip', 'time'} tips.
+        :return: Number of tips counted, those not already counted.
+        """
+        counted = sum(self.record_tip(tip['raintip'], tip.get('tip_id'), tip.get('time'))
+                      for tip in tips)
+        self.publish()
+        return counted
+
+    def record_tip(self, tip_amount, tip_id, tip_time):
+        tip_amount = float(tip_amount)
+        if not tip_amount:
+            return False
+        tip_time = tip_time or time.time()
+        # The totals, peak rate and its rain day are updated together
+        with self.journal.lock:
+            if not self.journal.tip(tip_amount, tip_id, tip_time):
+                logging.info('Duplicate rain tip ' + str(tip_id) + ' ignored')
+                return False
+            # A late tip of an earlier rain day doesn't count towards today's peak
+            current = self.roll_peak(self.journal.totals.keys(tip_time)['day'])
+            self.intensity.tip(tip_amount, tip_time, peak=current)
+        return True
 
-    def data_update(self, tip_amount):
-        self.daily_total = self.daily_total + float(tip_amount)
+    def roll_peak(self, rain_day):
+        """Start a new peak rain rate for each rain day, going by the rain
+        day of the tip or reading rather than of when it was received. The
+        journal lock must be held.
+        :return: True if the rain day is the one the peak rate is for.
+        """
+        if self.peak_day is None or rain_day > self.peak_day:
+            self.peak_day = rain_day
+            self.intensity.reset()
+        return rain_day == self.peak_day
 
     def get_total(self):
         """
         Get the latest instrument readings.
         :return: JSON formatted instrument readings.
         """
+        with self.journal.lock:
+            fields = self.journal.fields()
+            self.roll_peak(fields['rain_day'])
+            # Accumulations and intensity from the tip times
+            fields.update(self.intensity.fields())
         return [
             {
                 'measurement': 'rainfall',
-                'fields': {
-                    'daily_total_mm': round(self.daily_total, 1)
-                }
+                'fields': fields
             }
-        ]
\ No newline at end of file
+        ]
+
@@ -1,8 +1,9 @@
 import json
 import re
 import logging
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from rainfall import RAINFALL
+from unix_http import serve_unix_socket
 
 logging.basicConfig(level=logging.INFO)
 logging.captureWarnings(True)
@@ -24,8 +25,25 @@ class RAINFALLservice:
         Pass the received data to the sensor data decoder.
         :param data: string or JSON formatted 'as read' sensor data.
         """
-        tip_amount = self.find_numeric_data(data)
-        self.recorder.data_update(tip_amount[0])
+        try:
+            # {"tip_id": "...", "raintip": 0.2} from the rain gauge service
+            tip = json.loads(data)
+            tip_amount, tip_id = tip['raintip'], tip.get('tip_id')
+        except (ValueError, TypeError, KeyError):
+            tip_amount, tip_id = self.find_numeric_data(data)[0], None
+        self.recorder.data_update(tip_amount, tip_id)
+
+    def set_batch(self, data):
+        """
+        Pass a batch of tips from the rain gauge service to the recorder.
+        :param data: JSON list of {"tip_id", "raintip", "time"} tips.
+        :return: Number of tips counted, repeats of tips are ignored.
+        """
+        return self.recorder.batch_update(json.loads(data))
+
+    def reset(self):
+        """Start the since reset rain total again"""
+        self.recorder.reset_total()
 
     @staticmethod
     def find_numeric_data(dataline):
@@ -45,33 +63,53 @@ class RAINFALLservice:
 
 
 class RAINFALLhttp(BaseHTTPRequestHandler):
-    def _set_headers(self):
-        self.send_response(200)
+    # Keep connections open between requests, e.g. for the rain gauge
+    # service's tip batches
+    protocol_version = 'HTTP/1.1'
+
+    def _set_headers(self, content_length=0, status=200):
+        self.send_response(status)
         self.send_header('Content-type', 'text/html')
+        self.send_header('Content-Length', str(content_length))
         self.end_headers()
 
     def do_GET(self):
-        self._set_headers()
         totals = RAINFALLservice.get_data()
-        self.wfile.write(json.dumps(totals[0]['fields']).encode('UTF-8'))
+        body = json.dumps(totals[0]['fields']).encode('UTF-8')
+        self._set_headers(len(body))
+        self.wfile.write(body)
 
     def do_HEAD(self):
         self._set_headers()
 
     def do_POST(self):
         content_length = int(self.headers['Content-Length'])
-        body = self.rfile.read(content_length)
-        RAINFALLservice.set_data(str(body))
-        self.send_response(200)
-        self.end_headers()
+        body = self.rfile.read(content_length).decode('UTF-8', errors='replace')
+        if self.path == '/reset':
+            RAINFALLservice.reset()
+            self._set_headers()
+        elif self.path == '/batch':
+            try:
+                counted = RAINFALLservice.set_batch(body)
+            except (ValueError, TypeError, KeyError) as error:
+                logging.warning('Invalid rain tip batch: ' + str(error))
+                self._set_headers(status=400)
+                return
+            reply = json.dumps({'counted': counted}).encode('UTF-8')
+            self._set_headers(len(reply))
+            self.wfile.write(reply)
+        else:
+            RAINFALLservice.set_data(body)
+            self._set_headers()
 
 
 """ Start the server that answers requests for readings and inputs received data
 for extraction and processing """
 RAINFALLservice = RAINFALLservice()
+serve_unix_socket('rainfall', RAINFALLhttp)
 
 while True:
     server_address = ('', 80)
-    httpd = HTTPServer(server_address, RAINFALLhttp)
+    httpd = ThreadingHTTPServer(server_address, RAINFALLhttp)
     logging.info('RAINFALL service running')
     httpd.serve_forever()
@@ -0,0 +1,98 @@
+import json
+import time
+import random
+import argparse
+from datetime import datetime
+import compact_codec
+
+FIELDS = ('pressure', 'trend', 'tendency', 'humidity', 'tempc', 'dewptc',
+          'rainrate', 'windspeed', 'winddir', 'windgustkts',
+          'winddir_avg10m', 'windspd_avg10m', 'dailyrainmm', 'day_max',
+          'night_min', 'qnh', 'qfe')
+
+
+def observation(sparse):
+    """A representative AWS IoT observation message.
+    :param sparse: Leave some sensors without values, as before the
+    pressure tendency or the day/night extremes are available.
+    """
+    data = {'pressure': round(random.uniform(990, 1030), 2),
+            'trend': random.randint(0, 8),
+            'tendency': round(random.uniform(-3, 3), 1),
+            'humidity': round(random.uniform(40, 100), 1),
+            'tempc': round(random.uniform(-5, 30), 2),
+            'dewptc': round(random.uniform(-8, 20), 2),
+            'rainrate': 0.0,
+            'windspeed': random.randint(0, 40),
+            'winddir': random.randint(0, 359),
+            'windgustkts': random.randint(0, 60),
+            'winddir_avg10m': random.randint(0, 359),
+            'windspd_avg10m': random.randint(0, 40),
+            'dailyrainmm': round(random.uniform(0, 20), 1),
+            'day_max': round(random.uniform(10, 30), 1),
+            'night_min': round(random.uniform(-5, 10), 1),
+            'qnh': round(random.uniform(990, 1030), 2),
+            'qfe': round(random.uniform(990, 1030), 2)}
+    if sparse:
+        for field in ('trend', 'tendency', 'day_max', 'night_min'):
+            data[field] = None
+    data['timestamp'] = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+    data['metpodID'] = 'mpduk1'
+    data['ttl'] = int(time.time()) + 86400
+    return data
+
+
+def measure(name, encode, messages, batch):
+    """Time encoding the messages, singly or as batches, and report the
+    mean payload bytes per observation."""
+    if batch > 1:
+        messages = [messages[i:i + batch] for i in range(0, len(messages), batch)]
+
+    started = time.perf_counter()
+    payloads = [encode(message) for message in messages]
+    elapsed = time.perf_counter() - started
+
+    observations = len(messages) * batch
+    total = sum(len(payload.encode('utf-8')) for payload in payloads)
+    print('%-8s %8.1f bytes/observation %8.2f us/observation' %
+          (name, total / observations, elapsed / observations * 1e6))
+    return total / observations
+
+
+def benchmark(count, batch, sparse):
+    messages = [observation(sparse) for _ in range(count)]
+
+    def verbose(data):
+        return json.dumps(data)
+
+    def compact(data):
+        if isinstance(data, list):
+            data = [compact_codec.encode(record) for record in data]
+        else:
+            data = compact_codec.encode(data)
+        return json.dumps(data, separators=(',', ':'))
+
+    # Check the round trip before timing anything
+    for data in messages[:100]:
+        decoded = compact_codec.decode(json.loads(compact(data)))
+        for field in FIELDS:
+            assert data[field] is None and decoded[field] is None or \
+                abs(data[field] - decoded[field]) < 0.01, field
+
+    print('%d observations, batches of %d' % (count, batch))
+    json_bytes = measure('json', verbose, messages, batch)
+    compact_bytes = measure('compact', compact, messages, batch)
+    print('compact is %.0f%% of the json payload size' % (compact_bytes / json_bytes * 100))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the payload size and encoding '
+                                                 'cost of the verbose JSON and compact '
+                                                 'AWS IoT message formats.')
+    parser.add_argument('--count', type=int, default=10000)
+    parser.add_argument('--batch', type=int, default=1,
+                        help='Observations per message, as in batching mode')
+    parser.add_argument('--sparse', action='store_true',
+                        help='Leave some values out, as when sensors are starting up')
+    args = parser.parse_args()
+    benchmark(args.count, args.batch, args.sparse)
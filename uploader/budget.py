@@ -0,0 +1,91 @@
+import os
+import math
+import calendar
+import logging
+from datetime import datetime, timedelta
+
+
+class BudgetController:
+    def __init__(self, usage, sinks, tick):
+        """Keeps the uploader inside a monthly cellular data allowance of
+        DATA_BUDGET_MB (0 to disable) by stretching or tightening every
+        sink's transmit interval. The recent daily usage is compared with
+        what is left of the allowance, less a DATA_BUDGET_RESERVE fraction
+        kept back for the end of the month, spread over the days remaining.
+        Intervals are scaled from the configured ones by the same factor,
+        limited to between BUDGET_MIN_FACTOR and BUDGET_MAX_FACTOR times.
+        :param usage: The DataUsage accounting.
+        :param sinks: List of sink instances.
+        :param tick: The uploader tick, intervals are kept multiples of it.
+        """
+        self.budget = float(os.getenv('DATA_BUDGET_MB', 0)) * 1024 * 1024
+        self.reserve = float(os.getenv('DATA_BUDGET_RESERVE', 0.1))
+        self.min_factor = float(os.getenv('BUDGET_MIN_FACTOR', 0.5))
+        self.max_factor = float(os.getenv('BUDGET_MAX_FACTOR', 12))
+        self.usage = usage
+        self.sinks = sinks
+        self.tick = tick
+        self.factor = 1.0
+
+        # The configured intervals the budget scales from
+        self.base = {sink.name: (sink.interval, sink.sample_interval, sink.realtime_interval)
+                     for sink in sinks}
+
+        if self.budget:
+            logging.info('Data budget %.0f MB a month' % (self.budget / 1024 / 1024))
+
+    def adjust(self, now=None):
+        """Work out the interval factor that keeps the projected usage for
+        the rest of the month within the allowance, and apply it."""
+        if not self.budget:
+            return
+
+        now = now or datetime.utcnow()
+        month_used = sum(self.usage.month(now.strftime('%Y-%m')).values())
+        days_in_month = calendar.monthrange(now.year, now.month)[1]
+        elapsed = now - now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        days_left = days_in_month - elapsed.total_seconds() / 86400
+
+        allowance = self.budget * (1 - self.reserve) - month_used
+        daily_allowance = max(allowance, 0) / max(days_left, 1 / 24)
+
+        # Usage over yesterday and today so far, at today's factor
+        today = now.date()
+        recent = self.usage.daily(today - timedelta(days=1))
+        for sink, used in self.usage.daily(today).items():
+            recent[sink] = recent.get(sink, 0) + used
+        seconds = 86400 + (now - datetime.combine(today, datetime.min.time())).total_seconds()
+        daily_rate = sum(recent.values()) * 86400 / seconds
+
+        if daily_rate <= 0:
+            return
+        if daily_allowance <= 0:
+            factor = self.max_factor
+        else:
+            factor = self.factor * daily_rate / daily_allowance
+        self.apply(min(max(factor, self.min_factor), self.max_factor))
+
+    def apply(self, factor):
+        """Scale every sink's intervals from the configured ones"""
+        if abs(factor - self.factor) < 0.01:
+            return
+        self.factor = factor
+        for sink in self.sinks:
+            interval, sample_interval, realtime_interval = self.base[sink.name]
+            sink.interval = self.scale(interval)
+            if sample_interval:
+                sink.sample_interval = self.scale(sample_interval)
+            if realtime_interval:
+                sink.realtime_interval = realtime_interval * factor
+            logging.info('Data budget: ' + sink.name + ' interval ' + str(sink.interval) + ' s')
+
+    def scale(self, interval):
+        """Scale an interval, rounded up to a whole number of ticks"""
+        return max(int(math.ceil(interval * self.factor / self.tick)), 1) * self.tick
+
+    def status(self):
+        """Dictionary of the budget state for the uploader usage endpoint"""
+        return {'budget': self.budget,
+                'reserve': self.reserve,
+                'factor': self.factor,
+                'intervals': {sink.name: sink.interval for sink in self.sinks}}
@@ -0,0 +1,102 @@
+import os
+import time
+import logging
+from collections import deque
+from threading import Lock
+
+
+class BurstMode:
+    def __init__(self, pressure_sensor, wind_sensor, rain_sensor):
+        """Severe weather detection on the live sensor streams, switching the
+        uploader to a high rate burst cadence while an event is under way.
+        Burst mode is triggered by any of:
+        - pressure falling by BURST_PRESSURE_FALL hPa or more over 3 hours
+        - a wind gust of BURST_GUST knots or more
+        - a rain rate of BURST_RAIN_RATE mm/h or more
+        Every sink then samples and transmits at least every BURST_INTERVAL
+        seconds. BURST_HOLD seconds after the last trigger the interval starts
+        to decay back, doubling every BURST_DECAY seconds until the sinks are
+        back on their own intervals. BURST_INTERVAL of 0 disables burst mode.
+        :param pressure_sensor: Sensor name of the pressure readings.
+        :param wind_sensor: Sensor name of the wind readings.
+        :param rain_sensor: Sensor name of the rain gauge readings.
+        """
+        self.interval = int(os.getenv('BURST_INTERVAL', 0))
+        self.hold = float(os.getenv('BURST_HOLD', 1800))
+        self.decay = float(os.getenv('BURST_DECAY', 600))
+        self.pressure_fall = float(os.getenv('BURST_PRESSURE_FALL', 3.0))
+        self.gust = float(os.getenv('BURST_GUST', 34))
+        self.rain_rate = float(os.getenv('BURST_RAIN_RATE', 10))
+
+        self.pressure_sensor = pressure_sensor
+        self.wind_sensor = wind_sensor
+        self.rain_sensor = rain_sensor
+
+        self.lock = Lock()
+        # Minute pressure samples (time, hPa) over the last 3 hours
+        self.pressure = deque()
+        self.triggered = None
+        self.reason = None
+
+        if self.interval:
+            logging.info('Burst mode enabled, interval ' + str(self.interval) + ' s')
+
+    def on_reading(self, sensor, fields):
+        """Sensor cache listener, run the detectors on a new reading"""
+        if not self.interval:
+            return
+        now = time.time()
+        if sensor == self.pressure_sensor and fields.get('pressure') is not None:
+            self.check_pressure(now, fields['pressure'])
+        if sensor == self.wind_sensor and is_at_least(fields.get('windgust'), self.gust):
+            self.trigger(now, 'gust %s kt' % fields['windgust'])
+        if sensor == self.rain_sensor and is_at_least(fields.get('rainrate'), self.rain_rate):
+            self.trigger(now, 'rain rate %s mm/h' % fields['rainrate'])
+
+    def check_pressure(self, now, pressure):
+        """Keep a 3 hour history of pressure, sampled once a minute, and
+        trigger when it has fallen by the threshold from the highest value"""
+        with self.lock:
+            if not self.pressure or now - self.pressure[-1][0] >= 60:
+                self.pressure.append((now, pressure))
+            while now - self.pressure[0][0] > 3 * 3600:
+                self.pressure.popleft()
+            fall = max(value for observed, value in self.pressure) - pressure
+        if fall >= self.pressure_fall:
+            self.trigger(now, 'pressure fall %.1f hPa in 3 h' % fall)
+
+    def trigger(self, now, reason):
+        with self.lock:
+            if self.triggered is None or now - self.triggered > self.hold:
+                logging.warning('Burst mode triggered: ' + reason)
+            self.triggered = now
+            self.reason = reason
+
+    def limit(self, now=None):
+        """The longest interval a sink may use right now.
+        :return: Seconds, or None when not in burst mode.
+        """
+        with self.lock:
+            if self.triggered is None:
+                return None
+            elapsed = (now or time.time()) - self.triggered - self.hold
+        if elapsed <= 0:
+            return self.interval
+        # Double the interval every decay period after the hold
+        return self.interval * 2 ** min(elapsed / self.decay, 32)
+
+    def status(self):
+        """Dictionary of the burst mode state for the uploader status endpoint"""
+        limit = self.limit()
+        with self.lock:
+            return {'interval': self.interval,
+                    'triggered': self.triggered,
+                    'reason': self.reason,
+                    'limit': limit}
+
+
+def is_at_least(value, threshold):
+    try:
+        return float(value) >= threshold
+    except (TypeError, ValueError):
+        return False
@@ -0,0 +1,92 @@
+import os
+import time
+import random
+import logging
+from threading import Lock
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a remote service while its circuit is open"""
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, name):
+        """Circuit breaker for the calls a sink makes to its remote service.
+        After CIRCUIT_FAILURES consecutive failures the circuit opens and
+        calls are refused for a backoff that doubles with every further
+        failure, from CIRCUIT_BACKOFF up to CIRCUIT_MAX_BACKOFF seconds, with
+        random jitter so retries don't all line up. Once the backoff has
+        passed a single trial call is let through (half open), closing the
+        circuit if it succeeds.
+        :param name: The sink name, for logging.
+        """
+        self.name = name
+        self.failure_threshold = int(os.getenv('CIRCUIT_FAILURES', 3))
+        self.base_backoff = float(os.getenv('CIRCUIT_BACKOFF', 30))
+        self.max_backoff = float(os.getenv('CIRCUIT_MAX_BACKOFF', 1800))
+
+        self.lock = Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened = None
+        self.retry_at = 0
+        self.last_error = None
+
+    def backoff(self):
+        """Jittered exponential backoff for the current number of failures,
+        at least half of the full backoff."""
+        exponent = max(self.failures - self.failure_threshold, 0)
+        delay = min(self.base_backoff * 2 ** min(exponent, 32), self.max_backoff)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def is_open(self):
+        """Check if calls are currently being refused, without using up the
+        half open trial call."""
+        with self.lock:
+            return self.state == HALF_OPEN or (self.state == OPEN and time.time() < self.retry_at)
+
+    def allow(self):
+        """Check if a call may be made now. Moves an open circuit whose
+        backoff has passed to half open, allowing that one call."""
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.time() >= self.retry_at:
+                self.state = HALF_OPEN
+                return True
+            return False
+
+    def success(self):
+        with self.lock:
+            if self.state != CLOSED:
+                logging.info(self.name + ' circuit closed')
+            self.state = CLOSED
+            self.failures = 0
+            self.opened = None
+            self.last_error = None
+
+    def failure(self, error=None):
+        with self.lock:
+            self.failures += 1
+            self.last_error = str(error) if error is not None else None
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state == CLOSED:
+                    self.opened = time.time()
+                self.state = OPEN
+                delay = self.backoff()
+                self.retry_at = time.time() + delay
+                logging.warning(self.name + ' circuit open, retrying in %.0f s' % delay)
+
+    def status(self):
+        """Dictionary of the circuit state for the uploader status endpoint"""
+        with self.lock:
+            return {'state': self.state,
+                    'failures': self.failures,
+                    'opened': self.opened,
+                    'retry_at': self.retry_at if self.state != CLOSED else None,
+                    'last_error': self.last_error}
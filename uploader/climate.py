@@ -0,0 +1,215 @@
+import os
+import json
+import time
+import logging
+import warnings
+from threading import Lock
+from sensor_cache import reading_time
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+# Summary periods of the meteorological day (UTC) as (start hour, hours):
+# daytime maximum 09-21, night minimum 21-09 and the 09-09 climate day
+PERIODS = {'day': (9, 12), 'night': (21, 12), 'metday': (9, 24)}
+
+
+def period_start(now, start_hour):
+    """Start (epoch seconds) of the most recent period starting at
+    start_hour UTC"""
+    start = now - now % DAY + start_hour * HOUR
+    return start if start <= now else start - DAY
+
+
+class ClimateSummary:
+    def __init__(self, temperature_sensor, pressure_sensor, wind_sensor, rainfall_sensor):
+        """Incremental daily climate summary, updated from every sensor
+        reading with a small fixed amount of state:
+        - day maximum temperature 09-21 UTC
+        - night minimum temperature 21-09 UTC
+        - maximum gust and its time, mean pressure and rain total over the
+          09-09 UTC climate day
+        The summary of a period is kept until the next period of the same
+        kind starts, e.g. the day maximum is reported until 09 UTC the next
+        day. Readings are placed by their own timestamp, and one no newer
+        than the last seen from its sensor (e.g. a retained MQTT message
+        replayed on reconnecting) is ignored so it isn't counted twice. The
+        latest and previous summaries are saved to CLIMATE_FILE so they
+        carry on across restarts.
+        :param temperature_sensor: Sensor name of the temperature readings.
+        :param pressure_sensor: Sensor name of the pressure readings.
+        :param wind_sensor: Sensor name of the wind readings.
+        :param rainfall_sensor: Sensor name of the daily rainfall total.
+        """
+        self.path = os.getenv('CLIMATE_FILE', '/data/climate.json')
+        self.temperature_sensor = temperature_sensor
+        self.pressure_sensor = pressure_sensor
+        self.wind_sensor = wind_sensor
+        self.rainfall_sensor = rainfall_sensor
+
+        self.lock = Lock()
+        # {period: summary} of the current and the previous period
+        self.current = dict()
+        self.previous = dict()
+        # Last rainfall total seen, rain is counted from the increases
+        self.rainfall_total = None
+        # {sensor: time of the latest reading seen}
+        self.last_seen = dict()
+        self.load()
+
+    @staticmethod
+    def new_period(period, start):
+        summary = {'start': start}
+        if period == 'day':
+            summary.update(tmax=None, tmax_time=None)
+        elif period == 'night':
+            summary.update(tmin=None, tmin_time=None)
+        else:
+            summary.update(gust=None, gust_time=None, pressure_sum=0.0,
+                           pressure_count=0, rain=0.0)
+        return summary
+
+    def roll(self, now):
+        """Start new periods as their start times come round, keeping the
+        summaries of the ones just finished."""
+        for period, (start_hour, hours) in PERIODS.items():
+            start = period_start(now, start_hour)
+            current = self.current.get(period)
+            if current is None or current['start'] < start:
+                if current is not None and current['start'] == start - DAY:
+                    self.previous[period] = current
+                else:
+                    # Nothing was recorded for the period before this one
+                    self.previous.pop(period, None)
+                self.current[period] = self.new_period(period, start)
+
+    def is_open(self, period, observed):
+        """Check if a reading taken at this time belongs in the current
+        period"""
+        start = self.current[period]['start']
+        return start <= observed < start + PERIODS[period][1] * HOUR
+
+    def on_reading(self, sensor, fields):
+        """Sensor cache listener, update the summary with a new reading"""
+        observed = reading_time(fields.get('timestamp'))
+        with self.lock:
+            if observed <= self.last_seen.get(sensor, 0):
+                return
+            self.last_seen[sensor] = observed
+            self.roll(time.time())
+            if sensor == self.temperature_sensor:
+                self.update_temperature(observed, fields.get('temperature'))
+            if sensor == self.pressure_sensor:
+                self.update_pressure(observed, fields.get('pressure'))
+            if sensor == self.wind_sensor:
+                self.update_gust(observed, fields.get('windgust'))
+            if sensor == self.rainfall_sensor:
+                self.update_rainfall(fields.get('daily_total_mm'))
+
+    def update_temperature(self, observed, temperature):
+        if not is_number(temperature):
+            return
+        day = self.current['day']
+        if self.is_open('day', observed) and (day['tmax'] is None or temperature > day['tmax']):
+            day['tmax'] = temperature
+            day['tmax_time'] = observed
+        night = self.current['night']
+        if self.is_open('night', observed) and (night['tmin'] is None or temperature < night['tmin']):
+            night['tmin'] = temperature
+            night['tmin_time'] = observed
+
+    def update_pressure(self, observed, pressure):
+        if not is_number(pressure) or not self.is_open('metday', observed):
+            return
+        metday = self.current['metday']
+        metday['pressure_sum'] += pressure
+        metday['pressure_count'] += 1
+
+    def update_gust(self, observed, gust):
+        if not is_number(gust) or not self.is_open('metday', observed):
+            return
+        metday = self.current['metday']
+        if metday['gust'] is None or gust > metday['gust']:
+            metday['gust'] = gust
+            metday['gust_time'] = observed
+
+    def update_rainfall(self, total):
+        """Count the rain from increases of the rainfall service's daily
+        total, which may be reset at a different time to the climate day."""
+        if not is_number(total):
+            return
+        last, self.rainfall_total = self.rainfall_total, total
+        if last is None:
+            return
+        self.current['metday']['rain'] += total - last if total >= last else total
+
+    def summary(self, now=None):
+        """The latest summary of each period.
+        :return: Dictionary of the day maximum, night minimum, climate day
+        gust, mean pressure and rain, with their times as ISO strings.
+        """
+        now = now or time.time()
+        with self.lock:
+            self.roll(now)
+            return {'latest': self.report(self.current),
+                    'previous': self.report(self.previous)}
+
+    @staticmethod
+    def report(periods):
+        day = periods.get('day', {})
+        night = periods.get('night', {})
+        metday = periods.get('metday', {})
+        count = metday.get('pressure_count')
+        return {'day_start': iso_time(day.get('start')),
+                'day_max': day.get('tmax'),
+                'day_max_time': iso_time(day.get('tmax_time')),
+                'night_start': iso_time(night.get('start')),
+                'night_min': night.get('tmin'),
+                'night_min_time': iso_time(night.get('tmin_time')),
+                'metday_start': iso_time(metday.get('start')),
+                'max_gust': metday.get('gust'),
+                'max_gust_time': iso_time(metday.get('gust_time')),
+                'mean_pressure': round(metday['pressure_sum'] / count, 1) if count else None,
+                'rain_mm': round(metday['rain'], 1) if metday else None}
+
+    def load(self):
+        try:
+            with open(self.path) as climate_file:
+                state = json.load(climate_file)
+            self.current = state['current']
+            self.previous = state['previous']
+            self.rainfall_total = state['rainfall_total']
+            self.last_seen = state.get('last_seen', {})
+            logging.info('Climate summary restored from ' + self.path)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            warnings.warn('Unable to read climate summary ' + self.path + ': ' + str(e), Warning)
+
+    def save(self):
+        """Write the summary state to file, replacing the previous file
+        atomically"""
+        with self.lock:
+            data = json.dumps({'current': self.current, 'previous': self.previous,
+                               'rainfall_total': self.rainfall_total,
+                               'last_seen': self.last_seen})
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w') as climate_file:
+                climate_file.write(data)
+                climate_file.flush()
+                os.fsync(climate_file.fileno())
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            warnings.warn('Unable to save climate summary ' + self.path + ': ' + str(e), Warning)
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def iso_time(timestamp):
+    if timestamp is None:
+        return None
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(timestamp))
@@ -0,0 +1,150 @@
+import os
+import json
+import warnings
+import local_socket
+from datetime import datetime
+from threading import Lock, local
+
+# Sink whose remote call is being made on this thread, see Sink.call()
+current = local()
+
+
+class DataUsage:
+    def __init__(self):
+        """Byte accounting of the data each sink sends and receives, kept
+        per UTC day and saved to DATA_USAGE_FILE so a month's usage survives
+        restarts. HTTP requests made on the shared session are counted from
+        their headers and bodies, other protocols (e.g. MQTT) are added by
+        the sink. Each request also counts DATA_USAGE_OVERHEAD bytes for the
+        TCP/TLS framing that isn't seen here, as do requests that failed
+        without a response.
+        """
+        self.path = os.getenv('DATA_USAGE_FILE', '/data/usage.json')
+        self.overhead = int(os.getenv('DATA_USAGE_OVERHEAD', 200))
+        # Days of usage kept, enough for the current and previous month
+        self.keep_days = 62
+
+        self.lock = Lock()
+        # {'YYYY-MM-DD': {sink: [sent bytes, received bytes, requests]}}
+        self.days = dict()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as usage_file:
+                self.days = json.load(usage_file)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            warnings.warn('Unable to read data usage ' + self.path + ': ' + str(e), Warning)
+
+    def save(self):
+        """Write the usage to file, replacing the previous file atomically"""
+        with self.lock:
+            for day in sorted(self.days)[:-self.keep_days]:
+                del self.days[day]
+            data = json.dumps(self.days)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w') as usage_file:
+                usage_file.write(data)
+                usage_file.flush()
+                os.fsync(usage_file.fileno())
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            warnings.warn('Unable to save data usage ' + self.path + ': ' + str(e), Warning)
+
+    def add(self, sink, sent, received, requests=1):
+        """Count bytes sent and received by a sink today"""
+        day = datetime.utcnow().strftime('%Y-%m-%d')
+        with self.lock:
+            counters = self.days.setdefault(day, {}).setdefault(sink, [0, 0, 0])
+            counters[0] += sent
+            counters[1] += received
+            counters[2] += requests
+
+    def daily(self, day):
+        """Total bytes used by each sink on a day.
+        :param day: datetime.date of the day.
+        :return: Dictionary of {sink: bytes}.
+        """
+        with self.lock:
+            usage = self.days.get(day.strftime('%Y-%m-%d'), {})
+            return {sink: sent + received for sink, (sent, received, requests) in usage.items()}
+
+    def month(self, month=None):
+        """Total bytes used by each sink in a month.
+        :param month: 'YYYY-MM', defaults to the current UTC month.
+        :return: Dictionary of {sink: bytes}.
+        """
+        month = month or datetime.utcnow().strftime('%Y-%m')
+        totals = dict()
+        with self.lock:
+            for day, usage in self.days.items():
+                if day.startswith(month):
+                    for sink, (sent, received, requests) in usage.items():
+                        totals[sink] = totals.get(sink, 0) + sent + received
+        return totals
+
+    def report(self):
+        """Dictionary of this month's usage for the uploader usage endpoint"""
+        month = datetime.utcnow().strftime('%Y-%m')
+        with self.lock:
+            days = {day: {sink: {'sent': sent, 'received': received, 'requests': requests}
+                          for sink, (sent, received, requests) in usage.items()}
+                    for day, usage in sorted(self.days.items()) if day.startswith(month)}
+        totals = self.month(month)
+        return {'month': month, 'total': sum(totals.values()), 'sinks': totals, 'days': days}
+
+
+def http_bytes(response):
+    """Approximate bytes on the wire of an HTTP request and its response,
+    not counting TLS.
+    :return: Tuple of (sent, received) bytes.
+    """
+    request = response.request
+    body = request.body or b''
+    sent = len(request.method) + len(request.path_url) + 12 + len(body) + \
+        sum(len(key) + len(value) + 4 for key, value in request.headers.items())
+    content = response.headers.get('Content-Length')
+    received = 17 + len(response.reason or '') + \
+        (int(content) if content and content.isdigit() else len(response.content)) + \
+        sum(len(key) + len(value) + 4 for key, value in response.headers.items())
+    return sent, received
+
+
+def count(sent, received, overhead=None):
+    """Count the bytes of a remote call made on this thread against the sink
+    making it, see start_call().
+    :param overhead: Bytes of framing to add, defaults to DATA_USAGE_OVERHEAD.
+    """
+    sink = getattr(current, 'sink', None)
+    if sink is None:
+        return
+    usage.add(sink, sent + (usage.overhead if overhead is None else overhead), received)
+    current.counted = True
+
+
+def count_response(response, *args, **kwargs):
+    """Session response hook counting the bytes of remote calls made by a
+    sink. Local sensor reads aren't made by a sink so aren't counted."""
+    count(*http_bytes(response))
+
+
+usage = DataUsage()
+local_socket.session.hooks['response'].append(count_response)
+
+
+def start_call(sink):
+    """Attribute HTTP requests made on this thread to a sink"""
+    current.sink = sink
+    current.counted = False
+
+
+def end_call(failed):
+    """Stop attributing requests to the sink. A failed call that got no
+    response still cost a connection attempt, so count the overhead."""
+    if failed and not getattr(current, 'counted', True):
+        usage.add(current.sink, usage.overhead, 0)
+    current.sink = None
@@ -0,0 +1,108 @@
+import os
+import time
+import logging
+from threading import Lock
+
+# Default deadband of each observation field, the smallest change worth
+# sending. Fields not listed are sent on any change.
+DEADBANDS = {'pressure': 0.1, 'qnh': 0.1, 'qfe': 0.1, 'tendency': 0.1,
+             'tempc': 0.1, 'dewptc': 0.1, 'humidity': 1.0,
+             'windspeed': 1.0, 'windgustkts': 1.0, 'windspd_avg10m': 1.0,
+             'winddir': 10.0, 'winddir_avg10m': 10.0,
+             'rainrate': 0.1, 'dailyrainmm': 0.1}
+
+
+class Deadband:
+    def __init__(self, prefix):
+        """Change-based transmit suppression for a sink. A field is only
+        sent when it has moved by at least its deadband since it was last
+        sent, and a full record is sent at least every heartbeat interval
+        whatever has changed. Configured per sink by <prefix>_HEARTBEAT
+        (seconds, 0 to send every record in full) and <prefix>_DEADBAND, a
+        list of field=deadband overrides e.g. 'tempc=0.2,humidity=2'.
+        :param prefix: The sink's setting prefix e.g. 'AWS'.
+        """
+        self.heartbeat = float(os.getenv(prefix + '_HEARTBEAT', 0))
+        self.deadbands = dict(DEADBANDS)
+        self.deadbands.update(parse_deadbands(os.getenv(prefix + '_DEADBAND', '')))
+
+        self.lock = Lock()
+        self.last_sent = dict()
+        self.last_full = 0
+        self.full = 0
+        self.partial = 0
+        self.suppressed = 0
+        self.bytes_saved = 0
+
+        if self.heartbeat:
+            logging.info(prefix + ' deadband enabled, heartbeat ' + str(self.heartbeat) + ' s')
+
+    def changed(self, field, value):
+        """Check if a field value differs from the one last sent by at least
+        the field's deadband."""
+        if field not in self.last_sent:
+            return True
+        last = self.last_sent[field]
+        if value is None or last is None:
+            return value is not last
+        if isinstance(value, (int, float)) and isinstance(last, (int, float)):
+            if field in ('winddir', 'winddir_avg10m'):
+                difference = abs((value - last + 180) % 360 - 180)
+            else:
+                difference = abs(value - last)
+            return difference >= self.deadbands.get(field, 0) and difference > 0
+        return value != last
+
+    def filter(self, fields, now=None):
+        """Select the fields of an observation that should be sent.
+        :param fields: Dictionary of field names and values.
+        :param now: Time of the observation, defaults to now.
+        :return: Dictionary of all the fields when a full record is due, the
+        changed fields only, or None if nothing has changed.
+        """
+        if not self.heartbeat:
+            return fields
+
+        now = time.time() if now is None else now
+        with self.lock:
+            if now - self.last_full >= self.heartbeat:
+                self.last_full = now
+                self.full += 1
+                selected = dict(fields)
+            else:
+                selected = {field: value for field, value in fields.items()
+                            if self.changed(field, value)}
+                if not selected:
+                    self.suppressed += 1
+                    return None
+                self.partial += 1
+            self.last_sent.update(selected)
+        return selected
+
+    def saved(self, full_bytes, sent_bytes):
+        """Count the bytes saved by sending sent_bytes instead of the full
+        record of full_bytes."""
+        with self.lock:
+            self.bytes_saved += max(full_bytes - sent_bytes, 0)
+
+    def status(self):
+        """Dictionary of the deadband counters for the status endpoint"""
+        with self.lock:
+            return {'heartbeat': self.heartbeat,
+                    'full': self.full,
+                    'partial': self.partial,
+                    'suppressed': self.suppressed,
+                    'bytes_saved': self.bytes_saved}
+
+
+def parse_deadbands(setting):
+    """Parse a deadband setting e.g. 'tempc=0.2,humidity=2' into a dictionary
+    of field deadbands, ignoring badly formed entries."""
+    deadbands = dict()
+    for entry in setting.split(','):
+        field, _, deadband = entry.partition('=')
+        try:
+            deadbands[field.strip()] = float(deadband)
+        except ValueError:
+            continue
+    return deadbands
@@ -0,0 +1,178 @@
+import math
+import functools
+
+# Physical constants
+GRAVITY = 9.80665
+GAS_CONSTANT = 287.04
+KELVIN = 273.15
+LAPSE_RATE = 0.0065
+HPA_PER_INCH_HG = 33.863886666667
+MPH_PER_KNOT = 1.152
+KMH_PER_KNOT = 1.852
+INCHES_PER_MM = 0.039370
+
+# All of the derivations are written with arithmetic operators only (or
+# select() and log() below) so they work the same on single float values and
+# on NumPy arrays of values, e.g. a day of archived readings in one call.
+# Single values of None give a None result, as when a sensor is down.
+
+
+def optional(function):
+    """Decorator returning None if any of the arguments is None"""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if any(arg is None for arg in args):
+            return None
+        return function(*args, **kwargs)
+    return wrapper
+
+
+def is_scalar(value):
+    """Check for a single value rather than an array of them"""
+    return getattr(value, 'shape', ()) == ()
+
+
+def select(condition, value, otherwise):
+    """Element-wise value if condition else otherwise"""
+    if is_scalar(condition):
+        return value if condition else otherwise
+    import numpy
+    return numpy.where(condition, value, otherwise)
+
+
+def log(value):
+    if is_scalar(value):
+        return math.log(value)
+    import numpy
+    return numpy.log(value)
+
+
+@optional
+def rounded(value, digits):
+    """Round a value or array, whole numbers of single values as int"""
+    if not is_scalar(value):
+        return value.round(digits)
+    if digits == 0:
+        return int(round(value))
+    return round(value, digits)
+
+
+class Site:
+    def __init__(self, altitude, baro_ht):
+        """Derivations that depend on the station site. The site only terms
+        are worked out once here rather than for every observation. With
+        either height not configured (None or an empty string) QNH, QFE and
+        MSLP can't be worked out and are None.
+        :param altitude: Site (airfield) height above mean sea level, metres.
+        :param baro_ht: Barometer height above the site, metres.
+        """
+        self.altitude = site_height(altitude)
+        self.baro_ht = site_height(baro_ht)
+        self.configured = self.altitude is not None and self.baro_ht is not None
+        if not self.configured:
+            return
+
+        # QNH, Ross Provan's (Met Office) method
+        self.qnh_const = 1 + 9.6e-5 * self.altitude + 6e-9 * self.altitude ** 2
+        self.qnh_offset = 0.022857 * self.altitude
+        self.qnh_baro_term = 0.003 * self.baro_ht
+        # QFE, hypsometric equation from the barometer down to the ground
+        self.qfe_term = self.baro_ht * GRAVITY / GAS_CONSTANT
+        # Mean sea level pressure from QFE, standard atmosphere lapse rate
+        self.mslp_lapse = LAPSE_RATE * self.altitude
+
+    @optional
+    def qnh(self, pressure, temperature):
+        """QNH (hPa) from the sensor pressure (hPa) and temperature (deg C)"""
+        if not self.configured:
+            return None
+        correction = 10 ** (self.baro_ht / (18429.1 + 67.53 * temperature + self.qnh_baro_term))
+        return pressure + self.qnh_offset + (self.qnh_const - 1) * pressure + \
+            self.qnh_const * (pressure * correction - pressure)
+
+    @optional
+    def qfe(self, pressure, temperature):
+        """Pressure at site ground level (hPa) from the sensor pressure (hPa)
+        and temperature (deg C)"""
+        if not self.configured:
+            return None
+        return pressure * (1 + self.qfe_term / (temperature + KELVIN))
+
+    @optional
+    def mslp(self, pressure, temperature):
+        """Mean sea level pressure (hPa), reducing QFE through the standard
+        atmosphere using the site temperature (deg C)"""
+        if not self.configured:
+            return None
+        qfe = self.qfe(pressure, temperature)
+        return qfe * (1 - self.mslp_lapse / (temperature + self.mslp_lapse + KELVIN)) ** -5.257
+
+
+def site_height(value):
+    """A configured site height (metres), or None if it is not set"""
+    if value is None or str(value).strip() == '':
+        return None
+    return float(value)
+
+
+@optional
+def to_fahrenheit(value, digits=1):
+    """Degrees C to Fahrenheit"""
+    return rounded(value * 1.8 + 32, digits)
+
+
+@optional
+def to_mph(value, digits=0):
+    """Knots to miles per hour"""
+    return rounded(value * MPH_PER_KNOT, digits)
+
+
+@optional
+def to_inch_hg(value, digits=2):
+    """hPa to inches of mercury"""
+    return rounded(value / HPA_PER_INCH_HG, digits)
+
+
+@optional
+def to_inches(value, digits=2):
+    """Millimetres to inches"""
+    return rounded(value * INCHES_PER_MM, digits)
+
+
+@optional
+def dew_point(temperature, humidity):
+    """Dew point (deg C) from temperature (deg C) and relative humidity (%),
+    Magnus formula"""
+    gamma = log(humidity / 100) + 17.62 * temperature / (243.12 + temperature)
+    return 243.12 * gamma / (17.62 - gamma)
+
+
+@optional
+def wind_chill(temperature, windspeed):
+    """Wind chill temperature (deg C) from temperature (deg C) and wind speed
+    (knots), JAG/TI formula. Outside its range (above 10 deg C or wind below
+    3 mph) the air temperature is returned."""
+    speed = windspeed * KMH_PER_KNOT
+    chill = 13.12 + 0.6215 * temperature - 11.37 * speed ** 0.16 + \
+        0.3965 * temperature * speed ** 0.16
+    return select((temperature <= 10) & (speed > 4.8), chill, temperature)
+
+
+@optional
+def heat_index(temperature, humidity):
+    """Heat index (deg C) from temperature (deg C) and relative humidity (%),
+    Rothfusz regression. Below 26.7 deg C (80 F) the air temperature is
+    returned."""
+    t = temperature * 1.8 + 32
+    index = -42.379 + 2.04901523 * t + 10.14333127 * humidity - \
+        0.22475541 * t * humidity - 6.83783e-3 * t * t - \
+        5.481717e-2 * humidity * humidity + 1.22874e-3 * t * t * humidity + \
+        8.5282e-4 * t * humidity * humidity - 1.99e-6 * t * t * humidity * humidity
+    return select(t >= 80, (index - 32) / 1.8, temperature)
+
+
+@optional
+def cloud_base(temperature, dewpoint):
+    """Estimated convective cloud base (feet above the site) from the
+    temperature and dew point spread (deg C)"""
+    return (temperature - dewpoint) * 400
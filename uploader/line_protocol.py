@@ -0,0 +1,112 @@
+import gzip
+import time
+from threading import Lock
+
+# Multipliers from epoch seconds to each InfluxDB write precision
+PRECISIONS = {'ns': 10 ** 9, 'u': 10 ** 6, 'ms': 10 ** 3, 's': 1, 'm': 1 / 60, 'h': 1 / 3600}
+
+
+def escape_measurement(name):
+    """Escape a measurement name for line protocol"""
+    return str(name).replace('\\', '\\\\').replace(',', '\\,').replace(' ', '\\ ')
+
+
+def escape_key(key):
+    """Escape a tag key, tag value or field key for line protocol"""
+    return escape_measurement(key).replace('=', '\\=')
+
+
+def format_value(value):
+    """Format a field value for line protocol. Numbers are always written as
+    floats so a field keeps the same type whatever the reading happens to
+    be, strings are quoted.
+    :return: Field value string, or None if there is no value to write.
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        if value != value:
+            # NaN can't be written to InfluxDB
+            return None
+        return repr(float(value))
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def format_point(measurement, fields, timestamp=None, tags=None, precision='s'):
+    """Format a single point as a line of line protocol. Fields without a
+    value are left out, rather than written as the string 'None'.
+    :param measurement: Measurement name.
+    :param fields: Dictionary of field names and values.
+    :param timestamp: Epoch seconds of the point, or None to let the server
+    stamp it on arrival.
+    :param tags: Optional dictionary of tag names and values.
+    :param precision: Timestamp precision, one of PRECISIONS.
+    :return: Line protocol string, or None if none of the fields have a value.
+    """
+    field_set = []
+    for key, value in fields.items():
+        value = format_value(value)
+        if value is not None:
+            field_set.append(escape_key(key) + '=' + value)
+    if not field_set:
+        return None
+
+    line = escape_measurement(measurement)
+    for key, value in sorted((tags or {}).items()):
+        if value is not None and value != '':
+            line += ',' + escape_key(key) + '=' + escape_key(value)
+    line += ' ' + ','.join(field_set)
+    if timestamp is not None:
+        line += ' ' + str(int(round(timestamp * PRECISIONS[precision])))
+    return line
+
+
+class LineProtocolWriter:
+    def __init__(self, precision='s', max_points=10000):
+        """Buffers timestamped points to be written to InfluxDB as a single
+        batch.
+        :param precision: Timestamp precision, one of PRECISIONS.
+        :param max_points: Most points to buffer, the oldest are dropped
+        beyond this.
+        """
+        if precision not in PRECISIONS:
+            raise ValueError('Unknown line protocol precision: ' + str(precision))
+        self.precision = precision
+        self.max_points = max_points
+        self.lock = Lock()
+        self.lines = []
+
+    def record(self, measurement, fields, timestamp=None, tags=None):
+        """Add a point to the batch, stamped now if no timestamp is given.
+        :return: The line recorded, or None if the point has no values.
+        """
+        line = format_point(measurement, fields,
+                            time.time() if timestamp is None else timestamp,
+                            tags, self.precision)
+        if line is None:
+            return None
+        with self.lock:
+            self.lines.append(line)
+            if len(self.lines) > self.max_points:
+                del self.lines[:len(self.lines) - self.max_points]
+        return line
+
+    def flush(self):
+        """Take the buffered points as one multi-line batch.
+        :return: Line protocol batch string, or None if there are no points.
+        """
+        with self.lock:
+            lines, self.lines = self.lines, []
+        if not lines:
+            return None
+        return '\n'.join(lines) + '\n'
+
+    def __len__(self):
+        return len(self.lines)
+
+
+def compress(batch):
+    """gzip a line protocol batch for a write with Content-Encoding: gzip"""
+    return gzip.compress(batch.encode('utf-8'))
@@ -0,0 +1,46 @@
+import os
+from urllib.parse import quote, urlsplit
+import requests_unixsocket
+
+# Session able to make requests over both TCP and Unix domain sockets.
+# Connections are pooled and kept alive between requests, including those
+# to remote services.
+session = requests_unixsocket.Session()
+
+
+def resolve_url(url):
+    """Rewrite a co-located service URL e.g. 'http://PTB220' to use the
+    service's Unix domain socket in the shared socket directory, if that
+    socket is available. Otherwise the URL is returned unchanged and the
+    request will go over TCP.
+    :param url: The http URL of the service.
+    :return: The URL the request should be made to.
+    """
+    socket_dir = os.getenv('SOCKET_DIR')
+    if not socket_dir or url is None:
+        return url
+
+    parts = urlsplit(url)
+    if parts.scheme != 'http' or parts.hostname is None:
+        return url
+
+    socket_path = os.path.join(socket_dir, parts.hostname + '.sock')
+    if not os.path.exists(socket_path):
+        return url
+
+    unix_url = 'http+unix://' + quote(socket_path, safe='') + (parts.path or '/')
+    if parts.query:
+        unix_url += '?' + parts.query
+    return unix_url
+
+
+def get(url, **kwargs):
+    """Make a GET request to a co-located service, preferring its Unix
+    domain socket when available."""
+    return session.get(resolve_url(url), **kwargs)
+
+
+def post(url, **kwargs):
+    """Make a POST request to a co-located service, preferring its Unix
+    domain socket when available."""
+    return session.post(resolve_url(url), **kwargs)
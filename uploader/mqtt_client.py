@@ -1,5 +1,10 @@
 import base64
 import os
+import time
+import random
+import logging
+import warnings
+import threading
 from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient
 
 
@@ -36,9 +41,9 @@ class MQTTclient:
         # AWSIoTMQTTClient connection configuration
         self.mqtt_client.configureAutoReconnectBackoffTime(1, 32, 20)
 
-        # Configure the offline queue for publish requests to be 20 in size
-        # and drop the oldest
-        self.mqtt_client.configureOfflinePublishQueueing(-1)
+        # Disable the in-memory offline queue, messages that can't be
+        # published are kept in the uploader's disk backed outbox instead
+        self.mqtt_client.configureOfflinePublishQueueing(0)
 
         # Used to configure the draining speed to clear up the queued requests
         # when the connection is back. (frequencyInHz)
@@ -50,6 +55,16 @@ class MQTTclient:
         # Configure MQTT operation timeout to be 5 seconds
         self.mqtt_client.configureMQTTOperationTimeout(5)
 
+        # The connection is kept open rather than made for every message, a
+        # long keep alive keeps the pings on an idle connection down.
+        self.keepalive = int(os.getenv('AWS_KEEPALIVE', 600))
+        self.connected = threading.Event()
+        self.mqtt_client.onOnline = self.connected.set
+        self.mqtt_client.onOffline = self.connected.clear
+
+        self.connect_thread = threading.Thread(target=self.connect, daemon=True)
+        self.connect_thread.start()
+
     @staticmethod
     def set_cred(env_name, file_name):
         """Turn base64 encoded environmental variable into a certificate file.
@@ -60,12 +75,29 @@ class MQTTclient:
         with open(file_name, "wb") as output_file:
             output_file.write(base64.b64decode(env))
 
+    def connect(self):
+        """Make the initial connection to AWS IoT, retrying with a jittered
+        exponential backoff until it succeeds. Once connected the SDK looks
+        after reconnecting itself, see configureAutoReconnectBackoffTime."""
+        backoff = 1
+        while True:
+            try:
+                if self.mqtt_client.connect(self.keepalive):
+                    self.connected.set()
+                    logging.info('AWS IoT connected')
+                    return
+            except Exception as e:
+                warnings.warn('AWS IoT connect failed: ' + str(e), Warning)
+            time.sleep(backoff + random.uniform(0, backoff))
+            backoff = min(backoff * 2, 300)
+
     def publish(self, topic, message_json):
-        """Publish a message using the MQTT client.
+        """Publish a message on the open MQTT connection.
         :param topic: The MQTT message topic to be used.
-        :param message_json: JSON formatted message."""
-        self.mqtt_client.connect()
-        self.mqtt_client.publish(topic, message_json, 1)
+        :param message_json: JSON formatted message.
+        :raise: ConnectionError if the message could not be published."""
+        if not self.connected.is_set():
+            raise ConnectionError('AWS IoT not connected')
+        if not self.mqtt_client.publish(topic, message_json, 1):
+            raise ConnectionError('AWS IoT publish request failed')
         print('Published topic %s: %s\n' % (topic, message_json))
-        self.mqtt_client.disconnect()
-
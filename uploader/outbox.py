@@ -0,0 +1,195 @@
+import os
+import json
+import zlib
+import glob
+import struct
+import logging
+import warnings
+from collections import deque
+from threading import Lock
+
+# Each record is its payload length and CRC32 followed by the JSON payload
+RECORD_HEADER = struct.Struct('<II')
+
+
+class Outbox:
+    def __init__(self, name):
+        """Durable store-and-forward queue of the messages a sink has not yet
+        been able to send. Messages are appended to a log file and fsync'd
+        before append() returns, and the position of the first unsent message
+        is kept in a separate file that is replaced atomically, so the queue
+        survives a crash or power cut at any point. A partly written record
+        at the end of the log is discarded on recovery.
+
+        The pending messages are limited to OUTBOX_MAX_BYTES. When full the
+        OUTBOX_DROP_POLICY decides whether the oldest pending messages or the
+        new message are dropped. Sent and dropped records are compacted out
+        of the log once they take up more than OUTBOX_MAX_BYTES, so the file
+        stays under about twice that however long the service is away.
+        :param name: The sink name, used to name the queue files.
+        """
+        self.name = name
+        self.directory = os.getenv('OUTBOX_DIR', '/data/outbox')
+        self.max_bytes = int(os.getenv('OUTBOX_MAX_BYTES', 5 * 1024 * 1024))
+        self.drop_policy = os.getenv('OUTBOX_DROP_POLICY', 'oldest')
+        self.dropped = 0
+
+        self.lock = Lock()
+        # Offset and length of every pending record in the log
+        self.pending = deque()
+        self.pending_bytes = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.generation, self.offset = self.read_position()
+        self.log = open(self.log_path(self.generation), 'a+b')
+        self.recover()
+
+        if self.pending:
+            logging.info('Outbox ' + name + ': ' + str(len(self.pending)) +
+                         ' unsent messages recovered')
+
+    def __len__(self):
+        return len(self.pending)
+
+    def log_path(self, generation):
+        return os.path.join(self.directory, '%s.%d.log' % (self.name, generation))
+
+    def position_path(self):
+        return os.path.join(self.directory, self.name + '.pos')
+
+    def read_position(self):
+        """Read the current log generation and the offset of the first
+        unsent record in it."""
+        try:
+            with open(self.position_path()) as position_file:
+                generation, offset = position_file.read().split()
+                return int(generation), int(offset)
+        except (OSError, ValueError):
+            return 0, 0
+
+    def write_position(self, generation, offset):
+        """Atomically replace the stored position of the first unsent
+        record."""
+        temp_path = self.position_path() + '.tmp'
+        with open(temp_path, 'w') as position_file:
+            position_file.write('%d %d' % (generation, offset))
+            position_file.flush()
+            os.fsync(position_file.fileno())
+        os.replace(temp_path, self.position_path())
+        self.generation, self.offset = generation, offset
+
+    def recover(self):
+        """Rebuild the index of pending records from the log, truncating any
+        incomplete record left at the end by a crash, and remove log files
+        of other generations left behind by an interrupted compaction."""
+        for path in glob.glob(os.path.join(self.directory, self.name + '.*.log')):
+            if path != self.log_path(self.generation):
+                os.remove(path)
+
+        self.log.seek(0, os.SEEK_END)
+        size = self.log.tell()
+        offset = self.offset if self.offset <= size else 0
+        self.log.seek(offset)
+        while offset + RECORD_HEADER.size <= size:
+            length, crc = RECORD_HEADER.unpack(self.log.read(RECORD_HEADER.size))
+            payload = self.log.read(length)
+            if len(payload) != length or zlib.crc32(payload) != crc:
+                break
+            self.pending.append((offset, RECORD_HEADER.size + length))
+            self.pending_bytes += RECORD_HEADER.size + length
+            offset += RECORD_HEADER.size + length
+
+        if offset != size:
+            warnings.warn('Outbox ' + self.name + ': discarding incomplete record', Warning)
+            self.log.truncate(offset)
+            os.fsync(self.log.fileno())
+
+    def append(self, message):
+        """Durably add a message to the end of the queue.
+        :param message: JSON serialisable message to be sent later.
+        """
+        payload = json.dumps(message).encode('UTF-8')
+        record = RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+        with self.lock:
+            if self.pending_bytes + len(record) > self.max_bytes:
+                if self.drop_policy == 'newest' or len(record) > self.max_bytes:
+                    self.dropped += 1
+                    warnings.warn('Outbox ' + self.name + ' full, message dropped', Warning)
+                    return
+                self.drop_oldest(len(record))
+
+            self.log.seek(0, os.SEEK_END)
+            offset = self.log.tell()
+            self.log.write(record)
+            self.log.flush()
+            os.fsync(self.log.fileno())
+            self.pending.append((offset, len(record)))
+            self.pending_bytes += len(record)
+
+    def drop_oldest(self, space):
+        """Drop the oldest pending messages to make space for a new one.
+        The lock must be held."""
+        dropped = 0
+        while self.pending and self.pending_bytes + space > self.max_bytes:
+            self.pending_bytes -= self.pending.popleft()[1]
+            dropped += 1
+        self.dropped += dropped
+        warnings.warn('Outbox ' + self.name + ' full, ' + str(dropped) +
+                      ' oldest messages dropped', Warning)
+        if self.pending and self.pending[0][0] <= self.max_bytes:
+            self.write_position(self.generation, self.pending[0][0])
+        else:
+            # Don't let the dropped records build up in the log during a
+            # long outage
+            self.compact()
+
+    def peek(self, count):
+        """Read the oldest pending messages without removing them.
+        :param count: Maximum number of messages to read.
+        :return: List of messages, oldest first.
+        """
+        with self.lock:
+            messages = []
+            for offset, length in list(self.pending)[:count]:
+                self.log.seek(offset + RECORD_HEADER.size)
+                messages.append(json.loads(self.log.read(length - RECORD_HEADER.size)))
+            return messages
+
+    def remove(self, count):
+        """Remove the oldest messages once they have been sent.
+        :param count: Number of messages to remove.
+        """
+        with self.lock:
+            for _ in range(min(count, len(self.pending))):
+                self.pending_bytes -= self.pending.popleft()[1]
+            if self.pending:
+                self.write_position(self.generation, self.pending[0][0])
+                if self.pending[0][0] > self.max_bytes:
+                    self.compact()
+            else:
+                self.compact()
+
+    def compact(self):
+        """Copy the pending records into a new log file, and switch to it,
+        so that the log doesn't grow without limit. The lock must be held."""
+        generation = self.generation + 1
+        with open(self.log_path(generation), 'w+b') as new_log:
+            for offset, length in self.pending:
+                self.log.seek(offset)
+                new_log.write(self.log.read(length))
+            new_log.flush()
+            os.fsync(new_log.fileno())
+
+        self.write_position(generation, 0)
+        old_path = self.log_path(generation - 1)
+        self.log.close()
+        os.remove(old_path)
+        self.log = open(self.log_path(generation), 'a+b')
+
+        offset = 0
+        pending = deque()
+        for _, length in self.pending:
+            pending.append((offset, length))
+            offset += length
+        self.pending = pending
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import calendar
+import logging
+import warnings
+import requests
+import local_socket
+from threading import Lock
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+import paho.mqtt.client as mqtt
+
+
+class SensorCache:
+    def __init__(self, client_id):
+        """Last-value cache of sensor readings. Subscribes to the sensor
+        topics on the local MQTT broker (e.g. 'metpod/ptb220') and keeps the
+        latest value of every field along with the time it was observed, so
+        an upload cycle can read the current station state without making
+        any network requests. Sensors with nothing cached yet (e.g. MQTT is
+        disabled or the broker is not up) are read over HTTP instead.
+        :param client_id: Unique MQTT client ID for this service.
+        """
+        self.enable = os.getenv('MQTT_ENABLE', 'false') == 'true'
+        self.topic_prefix = os.getenv('MQTT_TOPIC_PREFIX', 'metpod')
+        self.qos = int(os.getenv('MQTT_QOS', 0))
+        # Cached values older than this (seconds) are treated as missing
+        self.max_age = float(os.getenv('SENSOR_MAX_AGE', 600))
+        # Connect and read timeouts (seconds) for sensors read over HTTP
+        self.timeout = (float(os.getenv('SENSOR_CONNECT_TIMEOUT', 2)),
+                        float(os.getenv('SENSOR_TIMEOUT', 5)))
+        self.executor = ThreadPoolExecutor(max_workers=8)
+
+        self.lock = Lock()
+        # {sensor: {field: (value, observed time)}}
+        self.readings = {}
+        # Callbacks made with the sensor name on every new reading
+        self.listeners = []
+
+        if not self.enable:
+            return
+
+        mqtt_host = os.getenv('MQTT_HOST', 'mqtt')
+        mqtt_port = int(os.getenv('MQTT_PORT', 1883))
+
+        self.client = mqtt.Client(client_id)
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+        self.client.reconnect_delay_set(1, 60)
+        self.client.connect_async(mqtt_host, mqtt_port, keepalive=60)
+        self.client.loop_start()
+        logging.info('Sensor cache subscribing to ' + mqtt_host + ':' + str(mqtt_port))
+
+    def on_connect(self, client, userdata, flags, rc):
+        """(Re)subscribe to all sensor topics whenever the connection to the
+        broker is made."""
+        client.subscribe(self.topic_prefix + '/+', self.qos)
+
+    def on_message(self, client, userdata, message):
+        """Update the cache with the fields of a received sensor reading."""
+        sensor = message.topic.rsplit('/', 1)[-1]
+        try:
+            fields = json.loads(message.payload)
+        except ValueError:
+            warnings.warn('Invalid reading on topic ' + message.topic, Warning)
+            return
+
+        # A retained reading without a timestamp may be any age, so is
+        # treated as out of date rather than as observed on arrival
+        observed = reading_time(fields.get('timestamp'), 0 if message.retain else None)
+        with self.lock:
+            cached = self.readings.setdefault(sensor, {})
+            for field, value in fields.items():
+                if value is not None:
+                    cached[field] = (value, observed)
+
+        for listener in self.listeners:
+            try:
+                listener(sensor, fields)
+            except Exception:
+                # Keep the MQTT network loop and the other listeners going
+                logging.exception('Sensor cache listener failed on a ' + sensor + ' reading')
+
+    def publish(self, sensor, fields):
+        """Publish a reading of our own, e.g. the station observation, as a
+        retained message on a sensor topic for other services to use.
+        :param sensor: Sensor name used as the topic e.g. 'station'.
+        :param fields: Dictionary of the reading fields.
+        """
+        if not self.enable:
+            return
+        result = self.client.publish(self.topic_prefix + '/' + sensor, json.dumps(fields),
+                                     qos=self.qos, retain=True)
+        if result.rc != mqtt.MQTT_ERR_SUCCESS:
+            logging.debug('MQTT publish of ' + sensor + ' not sent: ' + mqtt.error_string(result.rc))
+
+    def add_listener(self, callback):
+        """Register a callback to be made with the sensor name (e.g.
+        'windsonic') and the reading fields whenever a new reading is cached.
+        Callbacks are made on the MQTT network thread so must return
+        quickly."""
+        self.listeners.append(callback)
+
+    def get(self, url, field):
+        """Get the latest value of a single field.
+        :param url: The sensor service URL e.g. 'http://PTB220'.
+        :param field: The reading field name e.g. 'pressure'.
+        :return: The cached value, or None if missing or out of date.
+        """
+        return self.snapshot([url])[url].get(field)
+
+    def age(self, url, field):
+        """Get the age of the cached value of a field.
+        :param url: The sensor service URL e.g. 'http://PTB220'.
+        :param field: The reading field name e.g. 'pressure'.
+        :return: Age in seconds, or None if nothing is cached.
+        """
+        with self.lock:
+            cached = self.readings.get(sensor_name(url), {}).get(field)
+        if cached is None:
+            return None
+        return time.time() - cached[1]
+
+    def snapshot(self, urls):
+        """Get the current readings of a number of sensors at once.
+        :param urls: The sensor service URLs to be read.
+        :return: Dictionary of {url: {field: value}} with out of date
+        fields removed.
+        """
+        oldest = time.time() - self.max_age
+        readings = dict()
+        with self.lock:
+            for url in urls:
+                cached = self.readings.get(sensor_name(url))
+                if cached:
+                    readings[url] = {field: value for field, (value, observed)
+                                     in cached.items() if observed >= oldest}
+
+        missing = [url for url in set(urls) if url not in readings]
+        readings.update(zip(missing, self.executor.map(self.fetch, missing)))
+        return readings
+
+    def fetch(self, url):
+        """Read a sensor over HTTP when there is nothing in the cache for it.
+        Sensors are fetched concurrently, each distinct URL once, over the
+        pooled keep-alive session.
+        :param url: The sensor service URL.
+        :return: The sensor readings, or an empty dictionary on failure.
+        """
+        try:
+            return local_socket.get(url, timeout=self.timeout).json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            warnings.warn('Unable to read ' + str(url) + ': ' + str(e), Warning)
+            return dict()
+
+
+def sensor_name(url):
+    """The sensor name used in MQTT topics for a service URL, e.g.
+    'http://PTB220' -> 'ptb220'."""
+    return urlsplit(url).hostname if url else None
+
+
+def reading_time(timestamp, default=None):
+    """Convert a reading timestamp e.g. '2020-06-01T12:00:00Z' to epoch
+    seconds, using the default, or the current time if None, for readings
+    without one."""
+    try:
+        return calendar.timegm(time.strptime(timestamp, '%Y-%m-%dT%H:%M:%SZ'))
+    except (TypeError, ValueError):
+        return time.time() if default is None else default
@@ -0,0 +1,78 @@
+import logging
+from collections import OrderedDict, Counter, deque
+from threading import Condition, Thread
+
+
+class SinkWorker:
+    def __init__(self, sink):
+        """Runs the jobs of a single sink (transmit, drain, push) on its own
+        thread, so a slow or unavailable remote service only ever holds up
+        its own sink. At most one job of each kind is kept waiting. If a job
+        comes round again while the previous one is still waiting, the
+        waiting job is replaced and counted as skipped rather than letting
+        runs overlap or pile up. A job submitted with a superseded callback
+        (e.g. a transmit, whose observation would otherwise be lost) has the
+        callback run with the replaced job's arguments instead, on the
+        worker thread ahead of the waiting jobs.
+        :param sink: The sink instance.
+        """
+        self.sink = sink
+        self.condition = Condition()
+        # {job name: (function, args)} in the order they were queued
+        self.pending = OrderedDict()
+        # (job name, callback, args) of replaced jobs still to be handed on
+        self.superseded = deque()
+        self.running = None
+        self.completed = Counter()
+        self.skipped = Counter()
+        self.failed = Counter()
+
+        self.thread = Thread(target=self.run, name='sink-' + sink.name, daemon=True)
+        self.thread.start()
+
+    def submit(self, job, function, *args, superseded=None):
+        """Queue a job to be run on the worker thread.
+        :param job: The job name e.g. 'transmit'.
+        :param function: The function to call.
+        :param args: Arguments for the function.
+        :param superseded: Function called with the arguments of this job if
+        it is replaced by the next one before it runs, or None to drop it.
+        """
+        with self.condition:
+            if job in self.pending:
+                self.skipped[job] += 1
+                logging.warning(self.sink.name + ' ' + job + ' still waiting, skipped a run')
+                replaced = self.pending[job]
+                if replaced[2] is not None:
+                    self.superseded.append((job + ' superseded', replaced[2], replaced[1]))
+            self.pending[job] = (function, args, superseded)
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.superseded:
+                    self.condition.wait()
+                if self.superseded:
+                    job, function, args = self.superseded.popleft()
+                else:
+                    job, (function, args, superseded) = self.pending.popitem(last=False)
+                self.running = job
+            try:
+                function(*args)
+                self.completed[job] += 1
+            except Exception:
+                self.failed[job] += 1
+                logging.exception('Uploader sink ' + self.sink.name + ' ' + job + ' failed')
+            finally:
+                with self.condition:
+                    self.running = None
+
+    def status(self):
+        """Dictionary of the worker state for the uploader status endpoint"""
+        with self.condition:
+            return {'running': self.running,
+                    'waiting': list(self.pending),
+                    'completed': dict(self.completed),
+                    'skipped': dict(self.skipped),
+                    'failed': dict(self.failed)}
@@ -0,0 +1,224 @@
+import os
+import time
+import logging
+import warnings
+import data_usage
+from datetime import datetime
+from importlib import import_module
+from outbox import Outbox
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+
+# Sink classes registered by name, see register()
+SINKS = dict()
+
+
+def register(name):
+    """Class decorator registering a sink plugin under the name used to
+    enable it in the UPLOADER_SINKS setting. The plugin module must be
+    named the same, i.e. sinks/<name>.py."""
+    def decorator(cls):
+        cls.name = name
+        SINKS[name] = cls
+        return cls
+    return decorator
+
+
+class Sink:
+    """Base class for uploader sink plugins. Each sink is handed the same
+    station observation (see station.py), with derived values already
+    calculated, every time its transmit interval comes round. Subclasses
+    read their own settings in __init__, and implement build() to format
+    an observation into a message and send() to deliver it. Sinks that
+    batch up observations between transmissions set a sample_interval and
+    implement sample(). Sinks that push wind and rain readings as they
+    change set a realtime_interval and implement push().
+
+    Messages that can't be delivered are kept in the sink's outbox and
+    sent later by drain(), so send() should raise an exception for any
+    failure that is worth retrying. Remote calls go through call(), so
+    repeated failures open the sink's circuit breaker and the service is
+    left alone for a while."""
+    name = None
+
+    def __init__(self):
+        # Transmit to the remote service, otherwise just log the message
+        self.enable = False
+        # Seconds between transmissions
+        self.interval = 300
+        # Seconds between calls to sample(), or 0 not to sample
+        self.sample_interval = 0
+        # Shortest time (seconds) between calls to push(), or 0 not to push
+        self.realtime_interval = 0
+        # Store-and-forward queue of unsent messages, see load_sinks()
+        self.outbox = None
+        self.drain_batch = int(os.getenv('OUTBOX_BATCH_SIZE', 20))
+        self.drain_rate = float(os.getenv('OUTBOX_RATE', 1.0))
+        self.breaker = CircuitBreaker(self.name)
+        # Change-based transmit suppression, see deadband.py
+        self.deadband = None
+
+    def sample(self, observation):
+        """Record an observation to be included in the next transmission.
+        :param observation: Dictionary of the current station observation.
+        """
+        pass
+
+    def push(self, observation):
+        """Send an observation straight away as wind or rain readings come
+        in. Pushes are not queued in the outbox if they fail, a fresher one
+        will soon follow.
+        :param observation: Dictionary of the current station observation.
+        """
+        pass
+
+    def build(self, observation):
+        """Format an observation into a message for the remote service.
+        :param observation: Dictionary of the current station observation.
+        :return: JSON serialisable message, or None if there is nothing to
+        send.
+        """
+        raise NotImplementedError
+
+    def send(self, message):
+        """Deliver a message to the remote service.
+        :param message: Message as returned by build().
+        :raise: Exception if delivery failed and should be retried.
+        """
+        raise NotImplementedError
+
+    def transmit(self, observation):
+        """Build and send a message for an observation. If it can't be sent
+        it is queued in the outbox to be sent once the service is back.
+        :param observation: Dictionary of the current station observation.
+        """
+        message = self.build(observation)
+        if message is None:
+            return
+        logging.info(self.name + ' message prepped:')
+        logging.info(message)
+
+        if not self.enable:
+            return
+
+        try:
+            self.call(self.send, message)
+            logging.info(self.name + ' message transmitted')
+        except Exception as e:
+            warnings.warn(self.name + ' message queued, transmit failed: ' + str(e), Warning)
+            self.outbox.append(message)
+
+    def defer(self, observation):
+        """Queue the message for an observation in the outbox without trying
+        to send it, e.g. for a transmit that was still waiting when the next
+        one came round, so it is sent later by drain() rather than lost.
+        :param observation: Dictionary of the current station observation.
+        """
+        message = self.build(observation)
+        if message is None or not self.enable:
+            return
+        logging.info(self.name + ' message queued, transmit superseded')
+        self.outbox.append(message)
+
+    def drain(self):
+        """Send a batch of queued messages, oldest first, no faster than
+        the outbox rate limit. Stops at the first failure so the remaining
+        messages are kept for the next attempt."""
+        if not self.outbox or self.breaker.is_open():
+            return
+
+        messages = self.outbox.peek(self.drain_batch)
+        sent = 0
+        try:
+            for message in messages:
+                if sent:
+                    time.sleep(1.0 / self.drain_rate)
+                self.call(self.send, message)
+                sent += 1
+        except Exception as e:
+            warnings.warn(self.name + ' outbox drain failed: ' + str(e), Warning)
+        finally:
+            self.outbox.remove(sent)
+
+        if sent:
+            logging.info(self.name + ' sent ' + str(sent) + ' queued messages, ' +
+                         str(len(self.outbox)) + ' remaining')
+
+    def call(self, function, *args):
+        """Make a call to the remote service through the circuit breaker,
+        counting the data it uses against the sink.
+        :raise: CircuitOpenError if the circuit is open, otherwise any
+        exception raised by the call.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.name + ' circuit open')
+        data_usage.start_call(self.name)
+        try:
+            result = function(*args)
+        except Exception as e:
+            data_usage.end_call(failed=True)
+            self.breaker.failure(e)
+            raise
+        data_usage.end_call(failed=False)
+        self.breaker.success()
+        return result
+
+    def status(self):
+        """Dictionary of the sink state for the uploader status endpoint"""
+        status = {'enable': self.enable,
+                  'interval': self.interval,
+                  'outbox': len(self.outbox) if self.outbox is not None else 0,
+                  'dropped': self.outbox.dropped if self.outbox is not None else 0,
+                  'circuit': self.breaker.status()}
+        if self.deadband:
+            status['deadband'] = self.deadband.status()
+        return status
+
+
+def check_response(response):
+    """Check the response of a remote service to a message. Messages
+    rejected as invalid won't be accepted on a retry either, so these are
+    reported and dropped rather than queued.
+    :param response: The requests Response.
+    :raise: requests.HTTPError if the message should be retried.
+    """
+    if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+        warnings.warn('Message rejected with status ' + str(response.status_code) +
+                      ': ' + response.text[:200], Warning)
+        return
+    response.raise_for_status()
+
+
+def observed_time(observation):
+    """The UTC time an observation was taken, so messages built later (e.g.
+    a superseded transmit queued in the outbox) keep it, or the current
+    time if it has no timestamp.
+    :param observation: Dictionary of the station observation.
+    :return: datetime (UTC).
+    """
+    try:
+        return datetime.strptime(observation.get('timestamp'), '%Y-%m-%dT%H:%M:%SZ')
+    except (TypeError, ValueError):
+        return datetime.utcnow()
+
+
+def load_sinks(names):
+    """Import and set up the named sink plugins. A sink that fails to set
+    up is reported and left out rather than stopping the others.
+    :param names: List of sink plugin names e.g. ['aws_iot', 'corlysis'].
+    :return: List of sink instances.
+    """
+    sinks = []
+    for name in names:
+        name = name.strip()
+        if not name:
+            continue
+        try:
+            import_module('sinks.' + name)
+            sink = SINKS[name]()
+            if sink.enable:
+                sink.outbox = Outbox(name)
+            sinks.append(sink)
+            logging.info('Uploader sink loaded: ' + name)
+        except Exception as e:
+            warnings.warn('Unable to load uploader sink ' + name + ': ' + str(e), Warning)
+    return sinks
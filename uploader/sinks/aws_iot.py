@@ -0,0 +1,107 @@
+import os
+import json
+import time
+import logging
+import data_usage
+import compact_codec
+from threading import Lock
+from deadband import Deadband
+from sinks import Sink, register
+
+AWS_FIELDS = ('pressure', 'trend', 'tendency', 'humidity', 'tempc', 'dewptc',
+              'rainrate', 'windspeed', 'winddir', 'windgustkts',
+              'winddir_avg10m', 'windspd_avg10m', 'dailyrainmm', 'day_max',
+              'night_min', 'timestamp', 'qnh', 'qfe', 'metpodID')
+
+# Fields sent in every message, whether or not they have changed
+AWS_KEYS = ('timestamp', 'metpodID', 'ttl')
+
+# Bytes of MQTT PUBLISH/PUBACK and TLS record framing per QoS 1 message
+MQTT_PUBLISH_OVERHEAD = 4 + 29
+MQTT_PUBACK_BYTES = 4 + 29
+
+
+@register('aws_iot')
+class AWSIOTsink(Sink):
+    def __init__(self):
+        super().__init__()
+        self.enable = os.getenv('AWS_IOT_ENABLE', 'false') == 'true'
+        self.interval = int(os.getenv('AWS_TX_INTERVAL', '300'))
+        # Batching mode, sample an observation every AWS_SAMPLE_INTERVAL
+        # seconds and publish them together every AWS_TX_INTERVAL
+        self.sample_interval = int(os.getenv('AWS_SAMPLE_INTERVAL', '0'))
+        self.batch_size = int(os.getenv('AWS_BATCH_SIZE', '60'))
+        self.batch = []
+        self.batch_lock = Lock()
+        self.topic = os.getenv('TOPIC', 'mpduk_dev')
+        self.deadband = Deadband('AWS')
+        # 'json' or 'compact' positional arrays, see compact_codec.py
+        self.payload_format = os.getenv('AWS_PAYLOAD_FORMAT', 'json')
+        self.aws_mqtt_client = None
+
+        logging.info('AWS IoT transmit: ' + str(self.enable).lower())
+
+        if self.enable:
+            from mqtt_client import MQTTclient
+            self.aws_mqtt_client = MQTTclient()
+
+    def record(self, observation):
+        """Select the observation values published to AWS IoT, leaving out
+        the values that haven't changed (see deadband.py).
+        :return: Dictionary of values, or None if nothing has changed.
+        """
+        full = {field: observation[field] for field in AWS_FIELDS}
+
+        # 'time to live' data expiry parameter used in AWS Dynamo DB table
+        full['ttl'] = int(time.time()) + 86400
+
+        values = self.deadband.filter({field: value for field, value in full.items()
+                                       if field not in AWS_KEYS})
+        if values is not None and len(values) == len(full) - len(AWS_KEYS):
+            return full
+
+        data = None
+        if values is not None:
+            data = {key: full[key] for key in AWS_KEYS}
+            data.update(values)
+        self.deadband.saved(len(self.encode(full)), len(self.encode(data)) if data else 0)
+        return data
+
+    def encode(self, data):
+        """Serialise a message in the configured payload format"""
+        if self.payload_format == 'compact':
+            if isinstance(data, list):
+                data = [compact_codec.encode(record) for record in data]
+            else:
+                data = compact_codec.encode(data)
+            return json.dumps(data, separators=(',', ':'))
+        return json.dumps(data)
+
+    def sample(self, observation):
+        """Add an observation to the batch for the next publish"""
+        data = self.record(observation)
+        if data is None:
+            return
+        with self.batch_lock:
+            self.batch.append(data)
+            if len(self.batch) > self.batch_size:
+                del self.batch[:len(self.batch) - self.batch_size]
+
+    def build(self, observation):
+        """Format observation data as a JSON message for AWS IoT. In batching
+        mode the message is a JSON array of the observations sampled since
+        the last publish."""
+        if not self.sample_interval:
+            data = self.record(observation)
+            return self.encode(data) if data else None
+
+        with self.batch_lock:
+            batch, self.batch = self.batch, []
+        return self.encode(batch) if batch else None
+
+    def send(self, message):
+        """Publish the message to AWS IoT using the MQTT protocol provided by
+        mqtt_client.py"""
+        self.aws_mqtt_client.publish(self.topic, message)
+        data_usage.count(len(self.topic) + len(message.encode('utf-8')),
+                         MQTT_PUBACK_BYTES, MQTT_PUBLISH_OVERHEAD)
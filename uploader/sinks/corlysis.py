@@ -0,0 +1,74 @@
+import os
+import time
+import local_socket
+import logging
+from deadband import Deadband
+from line_protocol import LineProtocolWriter, format_point, compress
+from sinks import Sink, register, check_response
+
+# Line protocol field names of the station observation values
+CORLYSIS_FIELDS = (('temperature', 'tempc'), ('QNH', 'qnh'), ('QFE', 'qfe'),
+                   ('pressure', 'pressure'), ('tendency', 'tendency'),
+                   ('humidity', 'humidity'), ('dewpoint', 'dewptc'),
+                   ('rainrate', 'rainrate'), ('dailyrain', 'dailyrainmm'),
+                   ('windgust', 'windgustkts'), ('winddir', 'winddir_avg10m'),
+                   ('windspd', 'windspd_avg10m'), ('daymax', 'day_max'),
+                   ('nightmin', 'night_min'))
+
+
+@register('corlysis')
+class CORLYSISsink(Sink):
+    def __init__(self):
+        super().__init__()
+        self.enable = os.getenv('CORLYSIS_ENABLE', 'true') == 'true'
+        self.interval = int(os.getenv('CORLYSIS_TX_INTERVAL', '240'))
+        self.sample_interval = int(os.getenv('CORLYSIS_SAMPLE_INTERVAL', '60'))
+        self.db = os.getenv('CORLYSIS_DB', 'metpod')
+        self.auth = os.getenv('CORLYSIS_AUTH', 'token')
+        self.token = os.getenv('TOKEN')
+        self.corlysis_url = os.getenv('CORLYSIS_URL', 'https://corlysis.com:8086/write')
+        self.writer = LineProtocolWriter(os.getenv('CORLYSIS_PRECISION', 's'))
+        self.deadband = Deadband('CORLYSIS')
+
+        logging.info('CORLYSIS transmit: ' + str(self.enable).lower())
+
+    def sample(self, observation):
+        """Record a timestamped point of the observation for the next batch,
+        with only the fields that have changed (see deadband.py)"""
+        now = time.time()
+        fields = {name: observation[key] for name, key in CORLYSIS_FIELDS}
+        changed = self.deadband.filter(fields, now)
+        if changed is fields:
+            self.writer.record(observation['metpodID'], fields, now)
+            return
+
+        line = None
+        if changed is not None:
+            line = self.writer.record(observation['metpodID'], changed, now)
+        full = format_point(observation['metpodID'], fields, now, precision=self.writer.precision)
+        self.deadband.saved(len(full or ''), len(line or ''))
+
+    def build(self, observation):
+        """Format the points sampled since the last transmission as a single
+        InfluxDB line protocol batch for the Corlysis service.
+        :return: Dictionary of the batch and its timestamp precision, or None
+        if there are no points to write."""
+
+        if not len(self.writer):
+            # Not sampling between transmissions, just send the current values
+            self.sample(observation)
+
+        batch = self.writer.flush()
+        if batch is None:
+            return None
+        return {'precision': self.writer.precision, 'batch': batch}
+
+    def send(self, message):
+        """Write a gzip compressed line protocol batch to the Corlysis
+        database"""
+        params = {"db": self.db, "u": self.auth, "p": self.token,
+                  "precision": message['precision']}
+        headers = {'Content-Encoding': 'gzip', 'Content-Type': 'text/plain; charset=utf-8'}
+
+        check_response(local_socket.session.post(self.corlysis_url, params=params, headers=headers,
+                                                 data=compress(message['batch']), timeout=20))
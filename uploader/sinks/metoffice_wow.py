@@ -0,0 +1,40 @@
+import os
+import re
+import local_socket
+import logging
+from sinks import Sink, register, check_response, observed_time
+
+WOW_FIELDS = ('humidity', 'tempf', 'dewptf', 'rainin', 'windgustmph',
+              'windspeedmph', 'dailyrainin', 'baromin')
+
+
+@register('metoffice_wow')
+class WOWsink(Sink):
+    def __init__(self):
+        super().__init__()
+        self.enable = os.getenv('METOFFICE_WOW_ENABLE', 'true') == 'true'
+        self.interval = int(os.getenv('WOW_TX_INTERVAL', '300'))
+        self.wow_site_id = os.getenv('WOW_SITE_ID')
+        self.wow_auth_key = os.getenv('WOW_AUTH_KEY')
+        self.wow_url = os.getenv('WOW_URL', 'http://wow.metoffice.gov.uk/automaticreading')
+        self.softwaretype = os.getenv('SOFTWARETYPE', 'metpod4')
+
+        logging.info('MetOffice WOW transmit: ' + str(self.enable).lower())
+
+    def build(self, observation):
+        """Format observation data as request parameters for the Met Office
+        WoW website"""
+        data = {field: observation[field] for field in WOW_FIELDS}
+        data['winddir'] = observation['winddir_avg10m']
+
+        wow_dtg = observed_time(observation).strftime("%Y-%m-%d+%H:%M:%S")
+        wow_dtg = re.sub(':', '%3A', wow_dtg)
+        data['dateutc'] = wow_dtg
+        data['softwaretype'] = self.softwaretype
+        data['siteid'] = self.wow_site_id
+        data['siteAuthenticationKey'] = self.wow_auth_key
+        return data
+
+    def send(self, message):
+        """Transmit a formatted data message to the Met Office WoW website"""
+        check_response(local_socket.session.get(self.wow_url, params=message, timeout=20))
@@ -0,0 +1,85 @@
+import os
+import time
+import derive
+import local_socket
+import logging
+import warnings
+from sinks import Sink, register, check_response, observed_time
+
+WX_UNDERGROUND_FIELDS = ('humidity', 'tempf', 'dewptf', 'rainin', 'windgustmph',
+                         'windspeedmph', 'dailyrainin', 'baromin')
+
+
+@register('wx_underground')
+class WXUNDERGROUNDsink(Sink):
+    def __init__(self):
+        super().__init__()
+        self.enable = os.getenv('WX_UNDERGROUND_ENABLE', 'true') == 'true'
+        self.interval = int(os.getenv('WX_UNDERGROUND_TX_INTERVAL', '300'))
+        self.wx_underground_id = os.getenv('WX_UNDERGROUND_ID')
+        self.wx_underground_password = os.getenv('WX_UNDERGROUND_PASSWORD')
+        self.wx_underground_url = os.getenv('WX_UNDERGROUND_URL')
+        self.softwaretype = os.getenv('SOFTWARETYPE')
+        # RapidFire mode, push wind and rain as they change but no more often
+        # than every WX_UNDERGROUND_RAPIDFIRE_INTERVAL seconds (0 to disable)
+        self.realtime_interval = float(os.getenv('WX_UNDERGROUND_RAPIDFIRE_INTERVAL', '0'))
+        self.rapidfire_url = os.getenv('WX_UNDERGROUND_RAPIDFIRE_URL', 'https://rtupdate.wunderground.com/'
+                                       'weatherstation/updateweatherstation.php')
+        self.last_push = 0
+        self.last_pushed = None
+
+        logging.info('WxUnderground transmit: ' + str(self.enable).lower())
+
+    def build(self, observation):
+        """Format observation data as request parameters for the Weather
+        Underground website"""
+
+        data = dict()
+        data['softwaretype'] = self.softwaretype
+        data['ID'] = self.wx_underground_id
+        data['PASSWORD'] = self.wx_underground_password
+        data['action'] = 'updateraw'
+        data['realtime'] = 1
+        data['rtfreq'] = self.interval
+        # Explicit time rather than 'now' so queued messages keep their time
+        data['dateutc'] = observed_time(observation).strftime('%Y-%m-%d %H:%M:%S')
+
+        data.update((field, observation[field]) for field in WX_UNDERGROUND_FIELDS)
+        data['winddir'] = observation['winddir_avg10m']
+        return data
+
+    def send(self, message):
+        """Transmit a formatted data message to the Weather Underground
+        website"""
+        check_response(local_socket.session.get(self.wx_underground_url,
+                                                params=message, timeout=20))
+
+    def push(self, observation):
+        """RapidFire update with the current wind and rain, sent only when one
+        of the reported values has changed since the last push. Wind is
+        reported as the latest reading, along with the 10 minute averages."""
+        if time.time() - self.last_push < self.realtime_interval or self.breaker.is_open():
+            return
+
+        data = self.build(observation)
+        data['rtfreq'] = self.realtime_interval
+        data['windspeedmph'] = derive.to_mph(observation['windspeed'])
+        data['winddir'] = observation['winddir']
+        data['windspdmph_avg10m'] = derive.to_mph(observation['windspd_avg10m'])
+        data['winddir_avg10m'] = observation['winddir_avg10m']
+
+        # Compare at the resolution WU displays, ignoring the time
+        reported = {key: round(value, 1) if isinstance(value, float) else value
+                    for key, value in data.items() if key != 'dateutc'}
+        if reported == self.last_pushed:
+            return
+
+        self.last_push = time.time()
+        try:
+            self.call(self.send_rapidfire, data)
+            self.last_pushed = reported
+        except Exception as e:
+            warnings.warn('WxUnderground RapidFire push failed: ' + str(e), Warning)
+
+    def send_rapidfire(self, data):
+        check_response(local_socket.session.get(self.rapidfire_url, params=data, timeout=10))
@@ -0,0 +1,89 @@
+import os
+import derive
+from datetime import datetime
+from burst import BurstMode
+from climate import ClimateSummary
+from sensor_cache import SensorCache, sensor_name
+
+
+class Station:
+    def __init__(self):
+        """Builds the station observation shared by all of the uploader
+        sinks. The sensors are read once per snapshot and derived values
+        (QNH, QFE and unit conversions) are calculated once for every sink.
+        """
+        self.pressure_url = os.getenv('PRESSURE_URL')
+        self.humidity_url = os.getenv('HUMIDITY_URL')
+        self.temperature_url = os.getenv('TEMPERATURE_URL')
+        self.dewpt_url = os.getenv('DEWPT_URL')
+        self.winddir_url = os.getenv('WINDDIR_URL')
+        self.windspeed_url = os.getenv('WINDSPEED_URL')
+        self.raingauge_url = os.getenv('RAINGAUGE_URL')
+        self.rainfall_url = os.getenv('RAINFALL_URL')
+        self.site = derive.Site(os.getenv('SITE_ALTITUDE'), os.getenv('BARO_HT'))
+        self.site_ID = os.getenv('SITE_ID')
+        self.publish_enable = os.getenv('STATION_PUBLISH', 'true') == 'true'
+        self.sensor_urls = [self.pressure_url, self.humidity_url,
+                            self.temperature_url, self.dewpt_url,
+                            self.winddir_url, self.windspeed_url,
+                            self.raingauge_url, self.rainfall_url]
+        # Sensors whose readings trigger realtime pushes to the sinks
+        self.realtime_sensors = {sensor_name(url) for url in
+                                 (self.winddir_url, self.windspeed_url,
+                                  self.raingauge_url, self.rainfall_url) if url}
+        self.sensor_cache = SensorCache('uploader_cache')
+        self.burst = BurstMode(sensor_name(self.pressure_url), sensor_name(self.windspeed_url),
+                               sensor_name(self.raingauge_url))
+        self.sensor_cache.add_listener(self.burst.on_reading)
+        self.climate = ClimateSummary(sensor_name(self.temperature_url), sensor_name(self.pressure_url),
+                                      sensor_name(self.windspeed_url), sensor_name(self.rainfall_url))
+        self.sensor_cache.add_listener(self.climate.on_reading)
+
+    def snapshot(self):
+        """Take a snapshot of the current station observation.
+        :return: Dictionary of observed and derived values.
+        """
+        readings = self.sensor_cache.snapshot(self.sensor_urls)
+
+        data = dict()
+        data['pressure'] = readings[self.pressure_url].get('pressure')
+        data['trend'] = readings[self.pressure_url].get('pressure_trend')
+        data['tendency'] = readings[self.pressure_url].get('pressure_change')
+        data['humidity'] = readings[self.humidity_url].get('humidity')
+        data['tempc'] = readings[self.temperature_url].get('temperature')
+        data['dewptc'] = readings[self.dewpt_url].get('dew_point')
+        data['rainrate'] = readings[self.raingauge_url].get('rainrate')
+        data['windspeed'] = readings[self.windspeed_url].get('windspeed')
+        data['winddir'] = readings[self.winddir_url].get('winddir')
+        data['windgustkts'] = readings[self.windspeed_url].get('windgust')
+        data['winddir_avg10m'] = readings[self.winddir_url].get('winddir_avg10m')
+        data['windspd_avg10m'] = readings[self.windspeed_url].get('windspeed_avg10m')
+        data['dailyrainmm'] = readings[self.rainfall_url].get('daily_total_mm')
+        climate = self.climate.summary()['latest']
+        data['day_max'] = climate['day_max']
+        data['night_min'] = climate['night_min']
+        data['timestamp'] = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+        data['qnh'] = derive.rounded(self.site.qnh(data['pressure'], data['tempc']), 2)
+        data['qfe'] = derive.rounded(self.site.qfe(data['pressure'], data['tempc']), 2)
+        data['metpodID'] = self.site_ID
+
+        # Imperial units, as used by Met Office WOW and Weather Underground
+        data['tempf'] = derive.to_fahrenheit(data['tempc'])
+        data['dewptf'] = derive.to_fahrenheit(data['dewptc'])
+        data['rainin'] = derive.to_inches(data['rainrate'])
+        data['windgustmph'] = derive.to_mph(data['windgustkts'])
+        data['windspeedmph'] = derive.to_mph(data['windspd_avg10m'])
+        data['dailyrainin'] = derive.to_inches(data['dailyrainmm'])
+        data['baromin'] = derive.to_inch_hg(data['qnh'])
+
+        data['mslp'] = derive.rounded(self.site.mslp(data['pressure'], data['tempc']), 2)
+        data['windchill'] = derive.rounded(derive.wind_chill(data['tempc'], data['windspeed']), 1)
+        data['heat_index'] = derive.rounded(derive.heat_index(data['tempc'], data['humidity']), 1)
+        data['cloud_base'] = derive.rounded(derive.cloud_base(data['tempc'], data['dewptc']), 0)
+        return data
+
+    def publish(self, observation):
+        """Publish the station observation on the 'station' MQTT topic, e.g.
+        for the local archive"""
+        if self.publish_enable:
+            self.sensor_cache.publish('station', observation)
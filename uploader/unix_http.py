@@ -0,0 +1,51 @@
+import os
+import socket
+import logging
+import socketserver
+from threading import Thread
+from http.server import HTTPServer
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    """HTTP server listening on a Unix domain socket rather than TCP, so
+    that co-located containers sharing the socket volume can make requests
+    without going through the Docker network and DNS. Each connection is
+    served on its own thread so a client keeping its connection open
+    doesn't hold up the others."""
+    address_family = socket.AF_UNIX
+    daemon_threads = True
+
+    def server_bind(self):
+        """Remove any socket file left over from a previous run before
+        binding, and allow other containers to connect to it."""
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        socketserver.TCPServer.server_bind(self)
+        os.chmod(self.server_address, 0o666)
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+    def get_request(self):
+        """Unix socket peers have no address, give the request handler
+        something it can log."""
+        request, _ = self.socket.accept()
+        return request, ('local', 0)
+
+
+def serve_unix_socket(name, handler):
+    """Start a background HTTP server on a Unix domain socket in the shared
+    socket directory, if one is configured.
+    :param name: The service name, used as the socket file name.
+    :param handler: The BaseHTTPRequestHandler class serving the requests.
+    :return: The running server, or None if no socket directory is set.
+    """
+    socket_dir = os.getenv('SOCKET_DIR')
+    if not socket_dir:
+        return None
+
+    os.makedirs(socket_dir, exist_ok=True)
+    socket_path = os.path.join(socket_dir, name.lower() + '.sock')
+    httpd = UnixHTTPServer(socket_path, handler)
+    Thread(target=httpd.serve_forever, daemon=True).start()
+    logging.info('HTTP server listening on ' + socket_path)
+    return httpd
@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import logging
+import threading
+from math import gcd
+from functools import reduce
+from station import Station
+from sinks import load_sinks
+from sink_worker import SinkWorker
+from budget import BudgetController
+from data_usage import usage
+from unix_http import serve_unix_socket
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from apscheduler.triggers.interval import IntervalTrigger
+from pytz import utc
+from apscheduler.schedulers.background import BackgroundScheduler
+
+
+class UPLOADERservice:
+    def __init__(self):
+        """Single uploader runtime for all of the remote services. On every
+        tick one station snapshot is taken and handed to each enabled sink
+        whose transmit interval has come round. Each sink transmits on its
+        own worker thread, so one slow remote service can't hold up the
+        others."""
+
+        logging.basicConfig(level=logging.INFO)
+        logging.captureWarnings(True)
+
+        self.station = Station()
+        self.sinks = load_sinks(os.getenv('UPLOADER_SINKS',
+                                          'aws_iot,corlysis,metoffice_wow,wx_underground').split(','))
+
+        # Samples are taken before transmissions that fall on the same tick
+        self.jobs = [(sink, 'sample') for sink in self.sinks if sink.sample_interval]
+        self.jobs += [(sink, 'transmit') for sink in self.sinks]
+
+        # By default tick often enough to meet every job's interval exactly
+        intervals = [job_interval(sink, job) for sink, job in self.jobs] or [60]
+        if self.station.burst.interval:
+            intervals.append(self.station.burst.interval)
+        self.tick = int(os.getenv('UPLOADER_TICK', reduce(gcd, intervals)))
+        # When each job was last due, the next is due an interval later
+        self.last_due = [time.time()] * len(self.jobs)
+
+        self.workers = {sink.name: SinkWorker(sink) for sink in self.sinks}
+        self.budget = BudgetController(usage, self.sinks, self.tick)
+
+        logging.info('Uploader sinks: ' + ', '.join(sink.name for sink in self.sinks))
+
+        self.scheduler = BackgroundScheduler()
+        self.scheduler.configure(timezone=utc)
+
+        self.scheduler.add_job(self.upload, IntervalTrigger(seconds=self.tick),
+                               max_instances=1, coalesce=True)
+
+        # Event driven pushes for sinks with a realtime mode
+        self.realtime = [sink for sink in self.sinks if sink.enable and sink.realtime_interval]
+        self.readings_changed = threading.Event()
+        if self.realtime:
+            self.station.sensor_cache.add_listener(self.on_reading)
+            threading.Thread(target=self.push, daemon=True).start()
+        self.scheduler.add_job(self.drain, IntervalTrigger(
+            seconds=int(os.getenv('OUTBOX_DRAIN_INTERVAL', 60))), max_instances=1, coalesce=True)
+        self.scheduler.add_job(usage.save, IntervalTrigger(seconds=300))
+        self.scheduler.add_job(self.station.climate.save, IntervalTrigger(seconds=60))
+        self.scheduler.add_job(self.budget.adjust, IntervalTrigger(
+            seconds=int(os.getenv('BUDGET_INTERVAL', 3600))))
+
+    def upload(self):
+        """Take a station snapshot and fan it out to the sinks that are due
+        to sample or transmit. Allow half a tick of slack so scheduling
+        jitter doesn't make a sink miss its turn."""
+        now = time.time()
+        # Intervals are read each time as the data budget and burst mode
+        # change them
+        intervals = [self.job_interval(sink, job, now) for sink, job in self.jobs]
+        due = [i for i in range(len(self.jobs))
+               if now + self.tick / 2 >= self.last_due[i] + intervals[i]]
+        if not due:
+            return
+
+        observation = self.station.snapshot()
+        self.station.publish(observation)
+        for i in due:
+            sink, job = self.jobs[i]
+            self.last_due[i] += intervals[i]
+            if self.last_due[i] + intervals[i] <= now:
+                # Fallen behind, don't try to catch up on missed turns
+                self.last_due[i] = now
+            if job == 'transmit':
+                self.workers[sink.name].submit('transmit', sink.transmit, observation,
+                                               superseded=sink.defer)
+                continue
+            # Sampling is local, so it is done straight away
+            try:
+                sink.sample(observation)
+            except Exception:
+                logging.exception('Uploader sink ' + sink.name + ' failed')
+
+    def on_reading(self, sensor, fields):
+        """Sensor cache listener, wakes up the realtime push thread when a
+        wind or rain reading comes in."""
+        if sensor in self.station.realtime_sensors:
+            self.readings_changed.set()
+
+    def push(self):
+        """Push the station observation to the realtime sinks as wind and
+        rain readings come in. Readings arriving while a push is made or
+        during the minimum interval that follows are coalesced into the next
+        push."""
+        while True:
+            self.readings_changed.wait()
+            self.readings_changed.clear()
+            observation = self.station.snapshot()
+            for sink in self.realtime:
+                self.workers[sink.name].submit('push', sink.push, observation)
+            time.sleep(min(sink.realtime_interval for sink in self.realtime))
+
+    def drain(self):
+        """Retry messages queued in the sink outboxes while their remote
+        service was unavailable."""
+        for sink in self.sinks:
+            if sink.outbox:
+                self.workers[sink.name].submit('drain', sink.drain)
+
+    def get_status(self):
+        """Status of every sink, its outbox, circuit breaker and worker"""
+        status = dict()
+        for sink in self.sinks:
+            status[sink.name] = sink.status()
+            status[sink.name]['worker'] = self.workers[sink.name].status()
+        return status
+
+    def get_burst(self):
+        """State of the severe weather burst mode"""
+        return self.station.burst.status()
+
+    def job_interval(self, sink, job, now=None):
+        """The current interval of a sink's job, shortened in burst mode"""
+        interval = job_interval(sink, job)
+        limit = self.station.burst.limit(now)
+        return interval if limit is None else min(interval, limit)
+
+    def get_usage(self):
+        """This month's data usage and the budget controller state"""
+        report = usage.report()
+        report['budget'] = self.budget.status()
+        return report
+
+
+def job_interval(sink, job):
+    """The configured interval of a sink's 'sample' or 'transmit' job"""
+    return sink.sample_interval if job == 'sample' else sink.interval
+
+
+class UPLOADERhttp(BaseHTTPRequestHandler):
+    """Uploader status:
+    /status - state of every sink
+    /status/open - sinks whose circuit is currently open
+    /status/burst - severe weather burst mode
+    /climate - latest and previous daily climate summaries
+    /usage - this month's data usage per sink and day, and the data budget
+    """
+    def _set_headers(self, status=200):
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+
+    def do_GET(self):
+        path = self.path.split('?')[0].rstrip('/')
+        if path == '/status':
+            result = UPLOADERservice.get_status()
+        elif path == '/status/open':
+            result = {name: sink for name, sink in UPLOADERservice.get_status().items()
+                      if sink['circuit']['state'] != 'closed'}
+        elif path == '/status/burst':
+            result = UPLOADERservice.get_burst()
+        elif path == '/climate':
+            result = UPLOADERservice.station.climate.summary()
+        elif path == '/usage':
+            result = UPLOADERservice.get_usage()
+        else:
+            self._set_headers(404)
+            return
+        self._set_headers()
+        self.wfile.write(json.dumps(result).encode('UTF-8'))
+
+
+""" Start the uploader and the server that reports its status """
+if __name__ == '__main__':
+    UPLOADERservice = UPLOADERservice()
+    UPLOADERservice.scheduler.start()
+    logging.info('Uploader service running')
+
+    serve_unix_socket('uploader', UPLOADERhttp)
+
+    while True:
+        server_address = ('', int(os.getenv('UPLOADER_HTTP_PORT', 80)))
+        httpd = ThreadingHTTPServer(server_address, UPLOADERhttp)
+        logging.info('Uploader status HTTP server running')
+        httpd.serve_forever()